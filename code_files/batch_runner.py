@@ -0,0 +1,162 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pilot_cancer import *
+
+MANIFEST_COLUMNS = ["INPUT_FILE", "REFERENCE", "INVERT", "WINDOW_SIZE",
+                    "ERROR_SIZE", "OUTPUT_DIRECTORY"]
+# An optional last column, the gene panel of every family
+GENES_COLUMN = "GENES_FILE"
+
+
+def read_manifest(manifest_path):
+    """
+    This function will read a manifest of families, a tab separated file
+    with a header line and the following columns:
+    INPUT_FILE REFERENCE INVERT WINDOW_SIZE ERROR_SIZE OUTPUT_DIRECTORY
+    where INVERT is 0, 1 or 2 (both orientations), as in
+    create_tables_and_plots
+    The manifest may have a last GENES_FILE column, the gene panel of every
+    family (see create_tables_and_plots), otherwise the "genes_file" of the
+    families is None.
+    :return: list of families, each one a dict of its arguments
+    """
+    families = []
+    with open(manifest_path, 'r') as manifest_file:
+        header_columns = manifest_file.readline().strip().split('\t')
+        if header_columns not in (MANIFEST_COLUMNS,
+                                  MANIFEST_COLUMNS + [GENES_COLUMN]):
+            raise ValueError(f"{manifest_path}: the header should be "
+                             f"{' '.join(MANIFEST_COLUMNS)} "
+                             f"[{GENES_COLUMN}]")
+        for line in manifest_file:
+            if not line.strip():
+                continue
+            columns = line.strip().split('\t')
+            if len(columns) != len(header_columns):
+                raise ValueError(f"{manifest_path}: expected "
+                                 f"{len(header_columns)} columns in line: "
+                                 f"{line}")
+            input_file, reference_type, invert, window_size, error_size, \
+                save_directory = columns[:len(MANIFEST_COLUMNS)]
+            families.append({"input_file": input_file,
+                             "reference_type": reference_type,
+                             "invert": int(invert),
+                             "window_size": int(window_size),
+                             "error_size": int(error_size),
+                             "save_directory": save_directory,
+                             "genes_file": columns[len(MANIFEST_COLUMNS)]
+                             if len(columns) > len(MANIFEST_COLUMNS)
+                             else None})
+    return families
+
+
+def load_gene_panels(families, genes_file):
+    """
+    This function will load the gene panel of every family (genes_file for
+    the families without their own panel), each panel once
+    :return: dict of genes file (key): (common genes dict, genes index)
+    (value)
+    """
+    gene_panels = {}
+    for family in families:
+        family_genes_file = family["genes_file"] or genes_file
+        if family_genes_file not in gene_panels:
+            common_genes_dict = create_common_cancer_genes_dict(
+                family_genes_file)
+            gene_panels[family_genes_file] = (
+                common_genes_dict, create_genes_index(common_genes_dict))
+    return gene_panels
+
+
+def run_chromosome_tasks(chromosome_tasks, workers):
+    """
+    This function will run process_chromosome_orientations for every task
+    given, a dict of (family number, chromosome number) (key): arguments
+    (value). The tasks of all the families share a single pool of workers,
+    and the largest chromosomes are started first.
+    It yields ((family number, chromosome number), result) as the tasks
+    finish.
+    """
+    if workers <= 1:
+        for task, arguments in chromosome_tasks.items():
+            yield task, process_chromosome_orientations(*arguments)
+        return
+    largest_first = sorted(chromosome_tasks,
+                           key=lambda task: CHROMOSOME_SIZES[task[1]],
+                           reverse=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_chromosome_orientations,
+                                   *chromosome_tasks[task]): task
+                   for task in largest_first}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_batch(manifest_path, workers=1, index_chromosomes=True,
+              genes_file=GENES_FILE):
+    """
+    This function will create the interval tables and plots of every family
+    in the manifest (see read_manifest) in a single run.
+    The (family, chromosome) tasks of all the families are scheduled on one
+    pool of workers, and the genes index of every gene panel (genes_file, or
+    the GENES_FILE column of the manifest) is created once and shared by
+    its families. The merged tables of a family are written as soon as all
+    its chromosomes are done.
+    By default the family files are indexed by chromosome instead of being
+    split into chromosome files (see split_file_to_chromosomes).
+    """
+    families = read_manifest(manifest_path)
+    gene_panels = load_gene_panels(families, genes_file)
+    family_directories = []
+    chromosome_tasks = {}
+    for family_number, family in enumerate(families):
+        output_directories = interval_output_directories(
+            family["save_directory"], family["invert"])
+        family_directories.append(output_directories)
+        chromosome_inputs = prepare_chromosome_inputs(
+            family["input_file"], family["reference_type"],
+            family["save_directory"], index_chromosomes=index_chromosomes)
+        for chrom_num, chromosome_input in chromosome_inputs.items():
+            chromosome_tasks[(family_number, chrom_num)] = (
+                chromosome_input, family["reference_type"],
+                output_directories, chrom_num, family["window_size"],
+                family["error_size"])
+    family_results = [{} for _ in families]
+    num_finished_families = 0
+    for (family_number, chrom_num), result in run_chromosome_tasks(
+            chromosome_tasks, workers):
+        family_results[family_number][chrom_num] = result
+        if len(family_results[family_number]) < len(CHROMOSOME_SIZES):
+            continue
+        family = families[family_number]
+        common_genes_dict, genes_index = gene_panels[
+            family["genes_file"] or genes_file]
+        chromosome_results = {chrom_num: family_results[family_number][
+            chrom_num] for chrom_num in sorted(family_results[family_number])}
+        write_orientation_tables(chromosome_results,
+                                 family_directories[family_number],
+                                 common_genes_dict, genes_index,
+                                 family["window_size"], family["error_size"])
+        # Releasing the intervals of the finished family
+        family_results[family_number] = None
+        num_finished_families += 1
+        print(f"Finished family {family['input_file']} "
+              f"({num_finished_families}/{len(families)})")
+
+
+def main():
+    args = sys.argv[:]
+    workers = int(pop_option_argument(args, "--workers", 1))
+    genes_file = pop_option_argument(args, "--genes", GENES_FILE)
+    if len(args) != 2:
+        print("Invalid number of arguments.\n"
+              "manifest_file [--workers N] [--genes genes_file]\n"
+              "The manifest is a tab separated file with the header: \n"
+              + "\t".join(MANIFEST_COLUMNS) + f" [\t{GENES_COLUMN}]")
+        sys.exit(1)
+    run_batch(args[1], workers, genes_file=genes_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from pilot_cancer import *
+from synthetic_family import generate_family
+
+BENCHMARK_SIZES = (10000, 1000000, 10000000)
+
+
+def timed(stage_times, stage, function, *args):
+    """
+    This function will call function with the arguments given, and add the
+    time it took to stage_times[stage]
+    :return: the result of the function
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    stage_times[stage] = stage_times.get(stage, 0) + time.perf_counter() - start
+    return result
+
+
+def benchmark_chromosome(chromosome_file, chromosome, reference_type,
+                         tables_directory, window_size, error_size,
+                         stage_times):
+    """
+    This function will time the stages of a single chromosome, through the
+    per child dict stages (create_and_filter_dictionary, process_dict,
+    create_intervals), through the family matrix stages of every child, and
+    through the batched stages of all the children (used by
+    create_tables_and_plots)
+    :return: the shared interval list of the chromosome
+    """
+    num_children, child_files = timed(stage_times,
+                                      "open_and_split_children_files",
+                                      open_and_split_children_files,
+                                      chromosome_file)
+    interval_children_list = []
+    try:
+        for child_file in child_files:
+            child_dict = timed(stage_times, "create_and_filter_dictionary",
+                               create_and_filter_dictionary, child_file,
+                               reference_type)
+            windowed_dict = timed(stage_times, "process_dict", process_dict,
+                                  child_dict, reference_type, window_size,
+                                  error_size)
+            interval_children_list.append(timed(
+                stage_times, "create_intervals", create_intervals,
+                windowed_dict))
+    finally:
+        for child_file in child_files:
+            os.remove(child_file)
+    shared_interval_list = timed(stage_times, "shared_interval",
+                                 shared_interval, interval_children_list)
+    timed(stage_times, "create_table", create_table, shared_interval_list,
+          tables_directory, window_size, error_size, False, chromosome)
+
+    family_matrix = timed(stage_times, "read_family_matrix",
+                          read_family_matrix, chromosome_file)
+    for child_number in range(1, num_children + 1):
+        positions, haplotypes, _ = timed(
+            stage_times, "filter_child_genotypes", filter_children_genotypes,
+            family_matrix, reference_type, [(window_size, error_size)],
+            [child_number])[(window_size, error_size)][0]
+        timed(stage_times, "create_interval_array", create_interval_array,
+              positions, haplotypes)
+    timed(stage_times, "filter_children_genotypes", filter_children_genotypes,
+          family_matrix, reference_type, [(window_size, error_size)])
+    return shared_interval_list
+
+
+def run_benchmark(num_variants, work_directory, num_children=3,
+                  reference_type="parent", window_size=50, error_size=48,
+                  seed=0):
+    """
+    This function will generate a synthetic family of num_variants variants
+    in work_directory, and time every stage of the pipeline on it.
+    :return: dict with the "variants", "children", number of shared
+    "intervals" and the "stages" times in seconds
+    """
+    stage_times = {}
+    raw_file = os.path.join(work_directory, f"family_{num_variants}.txt")
+    num_written = timed(stage_times, "generate_family", generate_family,
+                        raw_file, num_variants, num_children, 2, 0.01, 0.001,
+                        True, os.path.join(work_directory, "real.shared.tsv"),
+                        seed)
+    timed(stage_times, "read_raw_family_matrices", read_raw_family_matrices,
+          raw_file)
+    family_file = timed(stage_times, "preprocess_file", preprocess_file,
+                        raw_file, work_directory)
+    chromosomes_directory = os.path.join(work_directory, "chromosomes")
+    timed(stage_times, "split_file_to_chromosomes", split_file_to_chromosomes,
+          family_file, chromosomes_directory)
+    tables_directory = os.path.join(work_directory, "interval_tables")
+    chromosome_intervals = {}
+    chromosome_coverage_dict = {}
+    num_intervals = 0
+    for chrom_num in range(1, 23):
+        shared_interval_list = benchmark_chromosome(
+            chromosome_file_path(chromosomes_directory, chrom_num), chrom_num,
+            reference_type, tables_directory, window_size, error_size,
+            stage_times)
+        chromosome_intervals[chrom_num] = shared_interval_list
+        chromosome_coverage_dict[chrom_num] = calc_coverage(
+            shared_interval_list, chrom_num)
+        num_intervals += len(shared_interval_list)
+    timed(stage_times, "merge_haplotype_tables", merge_haplotype_tables,
+          tables_directory, chromosome_intervals, chromosome_coverage_dict)
+    return {"variants": num_written,
+            "children": num_children,
+            "intervals": num_intervals,
+            "stages": stage_times}
+
+
+def run_benchmarks(output_file, sizes=BENCHMARK_SIZES, num_children=3,
+                   work_directory=None, seed=0):
+    """
+    This function will run run_benchmark for every number of variants in
+    sizes, and write the results to output_file as JSON
+    """
+    results = {"python": platform.python_version(),
+               "numpy": np.__version__,
+               "platform": platform.platform(),
+               "benchmarks": []}
+    for num_variants in sizes:
+        size_directory = tempfile.mkdtemp(prefix=f"benchmark_{num_variants}_",
+                                          dir=work_directory)
+        try:
+            results["benchmarks"].append(run_benchmark(
+                num_variants, size_directory, num_children, seed=seed))
+        finally:
+            shutil.rmtree(size_directory)
+        print(f"Finished {num_variants} variants")
+        # Writing after every size, so a long run keeps the results so far
+        with open(output_file, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time every stage of the pipeline on synthetic families")
+    parser.add_argument("output_file", help="the JSON results file")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=list(BENCHMARK_SIZES))
+    parser.add_argument("--children", type=int, default=3)
+    parser.add_argument("--work-directory", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    run_benchmarks(args.output_file, args.sizes, args.children,
+                   args.work_directory, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import hashlib
+import os
+
+import numpy as np
+
+from family_matrix import create_family_matrix
+
+CACHE_FILE_EXTENSION = ".npz"
+DEFAULT_CACHE_SIZE_LIMIT = 2 * 1024 ** 3
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_file(file_path):
+    """
+    This function will return the sha256 hash of the content of the file
+    given
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def create_cache_key(input_file, reference_type):
+    """
+    This function will create the cache key of a family file - the hash of
+    its content and the reference type
+    """
+    return f"{hash_file(input_file)}_{reference_type}"
+
+
+def cache_entry_path(cache_directory, cache_key):
+    return os.path.join(cache_directory, cache_key + CACHE_FILE_EXTENSION)
+
+
+def save_family_matrices(cache_directory, cache_key, family_matrices,
+                         size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+    """
+    This function will save the family matrices of all the chromosomes of a
+    family (as created by read_family_matrices) to a single .npz file in the
+    cache directory, and evict the least recently used entries if the cache
+    is larger than size_limit bytes
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    arrays = {"chromosomes": np.array(list(family_matrices), dtype=str)}
+    for chromosome_number, family_matrix in enumerate(
+            family_matrices.values()):
+        arrays[f"positions_{chromosome_number}"] = family_matrix['positions']
+        arrays[f"genotypes_{chromosome_number}"] = family_matrix['genotypes']
+    if family_matrices:
+        samples = next(iter(family_matrices.values()))['samples']
+        arrays["samples"] = np.array(samples, dtype=str)
+    entry_path = cache_entry_path(cache_directory, cache_key)
+    # Writing to a temporary file first, so a partial entry is never loaded
+    temporary_path = entry_path + ".tmp"
+    with open(temporary_path, 'wb') as cache_file:
+        np.savez(cache_file, **arrays)
+    os.replace(temporary_path, entry_path)
+    evict_least_recently_used(cache_directory, size_limit, keep=entry_path)
+
+
+def load_family_matrices(cache_directory, cache_key):
+    """
+    This function will load the family matrices saved under the cache key
+    given, and mark the entry as recently used.
+    :return: dict of chromosome (key): family matrix (value), or None if the
+    entry is not in the cache
+    """
+    entry_path = cache_entry_path(cache_directory, cache_key)
+    if not os.path.exists(entry_path):
+        return None
+    os.utime(entry_path)
+    family_matrices = {}
+    with np.load(entry_path) as arrays:
+        samples = arrays["samples"].tolist() if "samples" in arrays else []
+        for chromosome_number, chromosome in enumerate(
+                arrays["chromosomes"].tolist()):
+            family_matrices[chromosome] = create_family_matrix(
+                chromosome, arrays[f"positions_{chromosome_number}"],
+                arrays[f"genotypes_{chromosome_number}"], samples)
+    return family_matrices
+
+
+def evict_least_recently_used(cache_directory, size_limit, keep=None):
+    """
+    This function will delete the least recently used cache entries until
+    the total size of the cache is at most size_limit bytes.
+    The entry in keep (the one that was just saved) is never deleted.
+    """
+    entries = []
+    for file_name in os.listdir(cache_directory):
+        if file_name.endswith(CACHE_FILE_EXTENSION):
+            entry_path = os.path.join(cache_directory, file_name)
+            entry_stat = os.stat(entry_path)
+            entries.append((entry_stat.st_mtime, entry_stat.st_size,
+                            entry_path))
+    cache_size = sum(entry[1] for entry in entries)
+    for _, entry_size, entry_path in sorted(entries):
+        if cache_size <= size_limit:
+            break
+        if entry_path == keep:
+            continue
+        os.remove(entry_path)
+        cache_size -= entry_size
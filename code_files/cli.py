@@ -0,0 +1,221 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# The table-only path (importing pilot_cancer) should never load these
+HEAVY_MODULES = ("pandas", "matplotlib", "openpyxl", "tkinter", "test_scripts")
+# Seconds, for importing pilot_cancer in a fresh interpreter
+IMPORT_TIME_BUDGET = 0.5
+
+
+def preprocess_command(args):
+    from file_analyzer import preprocess_file
+    output_file_path = preprocess_file(args.input_file, args.output_directory,
+                                       args.compress)
+    if output_file_path is None:
+        print(f"{args.input_file} has no #CHROM header line")
+        return 1
+    print(output_file_path)
+    return 0
+
+
+def split_command(args):
+    from file_analyzer import split_file_to_chromosomes
+    split_file_to_chromosomes(args.input_file, args.output_directory,
+                              index_only=args.index_only,
+                              compress=args.compress)
+    return 0
+
+
+def run_genome_command(args):
+    from pilot_cancer import GENES_FILE, create_tables_and_plots
+    create_tables_and_plots(args.input_file, args.reference,
+                            args.output_directory, args.inverted,
+                            args.window_size, args.error_size,
+                            workers=args.workers,
+                            cache_directory=args.cache,
+                            index_chromosomes=args.index_chromosomes,
+                            incremental=not args.full,
+                            plots=args.plots, report=args.report,
+                            raw_input=args.raw,
+                            write_intermediates=args.write_intermediates,
+                            genes_file=args.genes or GENES_FILE)
+    return 0
+
+
+def run_chromosome_command(args):
+    from pilot_cancer import single_chromosome_process
+    single_chromosome_process(args.input_file, args.reference,
+                              args.output_directory_tables,
+                              None if args.no_plot
+                              else args.output_directory_plots,
+                              bool(args.inverted), args.chromosome_number,
+                              args.window_size, args.error_size,
+                              report=args.report)
+    return 0
+
+
+def run_region_command(args):
+    from pilot_cancer import region_process
+    region_process(args.input_file, args.chromosome_number, args.start,
+                   args.end, args.reference, args.output_directory_tables,
+                   None if args.no_plot else args.output_directory_plots,
+                   bool(args.inverted), args.window_size, args.error_size)
+    return 0
+
+
+def sweep_command(args):
+    from pilot_cancer import analyze_single_chromosome
+    analyze_single_chromosome(args.input_file, args.chromosome_number,
+                              args.reference, args.output_directory,
+                              tuple(args.window_sizes),
+                              tuple(args.error_percents))
+    return 0
+
+
+def measure_import_time(module_name="pilot_cancer"):
+    """
+    This function will import the module given in a fresh interpreter, and
+    measure the time it takes.
+    :return: (import time in seconds, list of the HEAVY_MODULES it loaded)
+    """
+    code_directory = os.path.dirname(os.path.abspath(__file__))
+    measure_code = (f"import sys, time\n"
+                    f"sys.path.insert(0, {code_directory!r})\n"
+                    f"start = time.perf_counter()\n"
+                    f"import {module_name}\n"
+                    f"print(time.perf_counter() - start)\n"
+                    f"print(' '.join(module for module in {HEAVY_MODULES!r}"
+                    f" if module in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", measure_code],
+                            capture_output=True, text=True,
+                            check=True).stdout.split('\n')
+    return float(output[0]), output[1].split()
+
+
+def import_budget_command(args):
+    import_time, heavy_modules = measure_import_time()
+    print(f"pilot_cancer import time: {import_time:.3f}s "
+          f"(budget {args.budget:.3f}s)")
+    if heavy_modules:
+        print(f"Heavy modules imported: {', '.join(heavy_modules)}")
+    return 0 if import_time <= args.budget and not heavy_modules else 1
+
+
+def add_run_arguments(parser):
+    parser.add_argument("input_file")
+    parser.add_argument("reference", choices=["parent", "sibling"])
+    parser.add_argument("inverted", type=int)
+    parser.add_argument("window_size", type=int)
+    parser.add_argument("error_size", type=int)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        description="Create shared haplotype interval tables of a family")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    preprocess_parser = subparsers.add_parser(
+        "preprocess", help="normalize the genotypes of a raw family file")
+    preprocess_parser.add_argument("input_file")
+    preprocess_parser.add_argument("output_directory")
+    preprocess_parser.add_argument("--compress", action="store_true",
+                                   help="write the result BGZF compressed")
+    preprocess_parser.set_defaults(function=preprocess_command)
+
+    split_parser = subparsers.add_parser(
+        "split", help="split a family file into chromosome files")
+    split_parser.add_argument("input_file")
+    split_parser.add_argument("output_directory")
+    split_parser.add_argument("--index-only", action="store_true",
+                              help="only write a byte offset index of the "
+                                   "chromosomes")
+    split_parser.add_argument("--compress", action="store_true",
+                              help="write the chromosome files BGZF "
+                                   "compressed")
+    split_parser.set_defaults(function=split_command)
+
+    run_genome_parser = subparsers.add_parser(
+        "run-genome", help="create the interval tables of all chromosomes")
+    add_run_arguments(run_genome_parser)
+    run_genome_parser.add_argument("output_directory")
+    run_genome_parser.add_argument("--workers", type=int, default=1)
+    run_genome_parser.add_argument("--cache", default=None,
+                                   help="cache directory of parsed families")
+    run_genome_parser.add_argument("--index-chromosomes", action="store_true")
+    run_genome_parser.add_argument("--full", action="store_true",
+                                   help="process all the chromosomes, even "
+                                        "if their outputs are up to date")
+    run_genome_parser.add_argument("--plots", default="chromosomes",
+                                   choices=["chromosomes", "deferred",
+                                            "overview", "none"])
+    run_genome_parser.add_argument("--report", action="store_true",
+                                   help="write run_report.json next to the "
+                                        "interval tables")
+    run_genome_parser.add_argument("--raw", action="store_true",
+                                   help="the input is a raw family file, "
+                                        "read without preprocessing and "
+                                        "splitting it to files")
+    run_genome_parser.add_argument("--write-intermediates",
+                                   action="store_true",
+                                   help="with --raw, also write the "
+                                        "preprocessed file")
+    run_genome_parser.add_argument("--genes", default=None,
+                                   help="the gene panel to look up in the "
+                                        "shared intervals (default: "
+                                        "the BROCA panel)")
+    run_genome_parser.set_defaults(function=run_genome_command)
+
+    run_chromosome_parser = subparsers.add_parser(
+        "run-chromosome", help="create the interval table of a chromosome")
+    add_run_arguments(run_chromosome_parser)
+    run_chromosome_parser.add_argument("output_directory_tables")
+    run_chromosome_parser.add_argument("output_directory_plots")
+    run_chromosome_parser.add_argument("chromosome_number", type=int)
+    run_chromosome_parser.add_argument("--no-plot", action="store_true")
+    run_chromosome_parser.add_argument("--report", action="store_true")
+    run_chromosome_parser.set_defaults(function=run_chromosome_command)
+
+    run_region_parser = subparsers.add_parser(
+        "run-region", help="create the interval table of a region of a "
+                           "chromosome, read through the region index")
+    add_run_arguments(run_region_parser)
+    run_region_parser.add_argument("output_directory_tables")
+    run_region_parser.add_argument("output_directory_plots")
+    run_region_parser.add_argument("chromosome_number", type=int)
+    run_region_parser.add_argument("start", type=int)
+    run_region_parser.add_argument("end", type=int)
+    run_region_parser.add_argument("--no-plot", action="store_true")
+    run_region_parser.set_defaults(function=run_region_command)
+
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="create the tables of a chromosome for many window and "
+                      "error sizes")
+    sweep_parser.add_argument("input_file")
+    sweep_parser.add_argument("chromosome_number", type=int)
+    sweep_parser.add_argument("reference", choices=["parent", "sibling"])
+    sweep_parser.add_argument("output_directory")
+    sweep_parser.add_argument("--window-sizes", type=int, nargs="+",
+                              default=[20, 30, 50])
+    sweep_parser.add_argument("--error-percents", type=float, nargs="+",
+                              default=[0.95, 0.9, 0.85])
+    sweep_parser.set_defaults(function=sweep_command)
+
+    import_budget_parser = subparsers.add_parser(
+        "import-budget", help="check the import time of the table-only path")
+    import_budget_parser.add_argument("--budget", type=float,
+                                      default=IMPORT_TIME_BUDGET)
+    import_budget_parser.set_defaults(function=import_budget_command)
+    return parser
+
+
+def main(argv=None):
+    # Plots are only saved to files, so no display is needed
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    args = create_parser().parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import gzip
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_SUFFIXES = (".gz", ".bgz")
+# Every BGZF block is a gzip member with a "BC" extra subfield holding the
+# size of the block, so the blocks can be found without decompressing
+BGZF_HEADER = struct.Struct('<4BI2BH')
+BGZF_MAX_BLOCK_DATA = 0xff00
+BGZF_EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b00"
+                               "03000000000000000000")
+BGZF_COMPRESS_LEVEL = 6
+DEFAULT_DECOMPRESSION_THREADS = min(4, os.cpu_count() or 1)
+# The number of blocks decompressed ahead of the reader, for every thread
+BLOCKS_AHEAD_PER_THREAD = 16
+READ_BUFFER_SIZE = 1 << 20
+
+
+def is_compressed(file_path):
+    """
+    This function will return True if the file given is gzip compressed
+    (including BGZF), according to its first bytes
+    """
+    with open(file_path, 'rb') as file:
+        return file.read(2) == GZIP_MAGIC
+
+
+def is_bgzf(file_path):
+    """
+    This function will return True if the file given is BGZF compressed
+    (e.g. by bgzip), so its blocks can be decompressed in parallel
+    """
+    with open(file_path, 'rb') as file:
+        header = file.read(BGZF_HEADER.size)
+        if len(header) < BGZF_HEADER.size:
+            return False
+        return bgzf_block_size(header, file.read(
+            BGZF_HEADER.unpack(header)[-1])) is not None
+
+
+def bgzf_block_size(header, extra_field):
+    """
+    This function will return the total size of a BGZF block from its gzip
+    header and extra field, or None if it is not a BGZF block
+    """
+    id1, id2, method, flags, _, _, _, extra_length = BGZF_HEADER.unpack(header)
+    if (id1, id2, method) != (0x1f, 0x8b, 8) or not flags & 4:
+        return None
+    subfield_start = 0
+    while subfield_start + 4 <= extra_length:
+        subfield_length = struct.unpack_from('<H', extra_field,
+                                             subfield_start + 2)[0]
+        if extra_field[subfield_start:subfield_start + 2] == b'BC' and \
+                subfield_length == 2:
+            return struct.unpack_from('<H', extra_field,
+                                      subfield_start + 4)[0] + 1
+        subfield_start += 4 + subfield_length
+    return None
+
+
+def read_bgzf_blocks(file):
+    """
+    This function will yield the compressed blocks of a BGZF file, without
+    decompressing them
+    """
+    while True:
+        header = file.read(BGZF_HEADER.size)
+        if not header:
+            return
+        extra_length = BGZF_HEADER.unpack(header)[-1]
+        extra_field = file.read(extra_length)
+        block_size = bgzf_block_size(header, extra_field)
+        if block_size is None:
+            raise ValueError(f"{file.name} is not a valid BGZF file")
+        yield header + extra_field + file.read(
+            block_size - BGZF_HEADER.size - extra_length)
+
+
+def decompress_bgzf_block(block):
+    """
+    This function will decompress a single BGZF block, and check it against
+    the CRC32 and size in its trailer
+    """
+    extra_length = BGZF_HEADER.unpack_from(block)[-1]
+    crc, data_size = struct.unpack_from('<2I', block, len(block) - 8)
+    data = zlib.decompress(block[BGZF_HEADER.size + extra_length:-8], -15)
+    if len(data) != data_size or zlib.crc32(data) != crc:
+        raise ValueError("corrupted BGZF block")
+    return data
+
+
+def decompress_bgzf_file(file_path, threads=DEFAULT_DECOMPRESSION_THREADS):
+    """
+    This function will yield the decompressed data of a BGZF file, in order.
+    The blocks are decompressed on a pool of threads (zlib releases the GIL),
+    up to BLOCKS_AHEAD_PER_THREAD blocks for every thread ahead of the
+    reader, so the memory used doesn't depend on the size of the file.
+    """
+    with open(file_path, 'rb') as file, \
+            ThreadPoolExecutor(max_workers=threads) as executor:
+        pending_blocks = deque()
+        for block in read_bgzf_blocks(file):
+            pending_blocks.append(executor.submit(decompress_bgzf_block,
+                                                  block))
+            if len(pending_blocks) >= threads * BLOCKS_AHEAD_PER_THREAD:
+                yield pending_blocks.popleft().result()
+        while pending_blocks:
+            yield pending_blocks.popleft().result()
+
+
+class BGZFReader(io.RawIOBase):
+    """
+    A binary file of the decompressed data of a BGZF file (see
+    decompress_bgzf_file)
+    """
+
+    def __init__(self, file_path, threads=DEFAULT_DECOMPRESSION_THREADS):
+        super().__init__()
+        self.name = file_path
+        self.chunks = decompress_bgzf_file(file_path, threads)
+        self.chunk = b''
+        self.chunk_offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.chunk_offset == len(self.chunk):
+            self.chunk = next(self.chunks, None)
+            self.chunk_offset = 0
+            if self.chunk is None:
+                self.chunk = b''
+                return 0
+        size = min(len(buffer), len(self.chunk) - self.chunk_offset)
+        buffer[:size] = self.chunk[self.chunk_offset:self.chunk_offset + size]
+        self.chunk_offset += size
+        return size
+
+    def close(self):
+        self.chunks.close()
+        super().close()
+
+
+class BGZFWriter(io.RawIOBase):
+    """
+    A binary file that writes BGZF compressed data (readable by gzip, bgzip
+    and BGZFReader), ending with the BGZF EOF block
+    """
+
+    def __init__(self, file_path, mode='w'):
+        super().__init__()
+        self.name = file_path
+        self.file = open(file_path, mode + 'b')
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        while len(self.data) >= BGZF_MAX_BLOCK_DATA:
+            self.write_block(bytes(self.data[:BGZF_MAX_BLOCK_DATA]))
+            del self.data[:BGZF_MAX_BLOCK_DATA]
+        return len(data)
+
+    def write_block(self, data):
+        compressor = zlib.compressobj(BGZF_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        compressed_data = compressor.compress(data) + compressor.flush()
+        block_size = BGZF_HEADER.size + 6 + len(compressed_data) + 8
+        self.file.write(BGZF_HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6))
+        self.file.write(struct.pack('<2sHH', b'BC', 2, block_size - 1))
+        self.file.write(compressed_data)
+        self.file.write(struct.pack('<2I', zlib.crc32(data), len(data)))
+
+    def close(self):
+        if not self.closed:
+            if self.data:
+                self.write_block(bytes(self.data))
+            self.file.write(BGZF_EOF_BLOCK)
+            self.file.close()
+        super().close()
+
+
+def has_compressed_suffix(file_path):
+    return file_path.endswith(GZIP_SUFFIXES)
+
+
+def compressed_path(file_path, compress):
+    """
+    This function will return the path of an output file, with a .gz suffix
+    if compress
+    """
+    return file_path + GZIP_SUFFIXES[0] if compress else file_path
+
+
+def uncompressed_name(file_name):
+    """
+    This function will remove the compression suffix from a file name (e.g.
+    family.txt.gz -> family.txt)
+    """
+    for suffix in GZIP_SUFFIXES:
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+
+def open_text(file_path, mode='r', threads=DEFAULT_DECOMPRESSION_THREADS,
+              buffering=-1):
+    """
+    This function will open a text file that may be compressed.
+    For reading, gzip and BGZF files are detected by their content - BGZF
+    files are decompressed on a pool of threads, and other gzip files with
+    the gzip module.
+    For writing ('w' or 'a'), files with a GZIP_SUFFIXES suffix are written
+    BGZF compressed.
+    """
+    if mode == 'r':
+        if not is_compressed(file_path):
+            return open(file_path, 'r', buffering=buffering)
+        if threads > 1 and is_bgzf(file_path):
+            return io.TextIOWrapper(io.BufferedReader(
+                BGZFReader(file_path, threads), READ_BUFFER_SIZE))
+        return gzip.open(file_path, 'rt')
+    if has_compressed_suffix(file_path):
+        return io.TextIOWrapper(io.BufferedWriter(
+            BGZFWriter(file_path, mode), READ_BUFFER_SIZE))
+    return open(file_path, mode, buffering=buffering)
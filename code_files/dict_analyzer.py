@@ -1,7 +1,12 @@
-from itertools import islice
+import numpy as np
+
+from family_matrix import GENOTYPE_CODES, UNKNOWN_GENOTYPE
+from run_report import add_count
 
 PARENT_REFERENCE = "parent"
 SIBLING_REFERENCE = "sibling"
+# The known genotype codes and UNKNOWN_GENOTYPE
+NUM_GENOTYPE_CODES = UNKNOWN_GENOTYPE + 1
 
 
 def check_heterozygous(parent):
@@ -84,6 +89,120 @@ def create_and_filter_dictionary(file_path, reference_type):
         return filter_dict_sibling_reference(result_dict)
 
 
+def create_genotype_pair_tables(reference_type):
+    """
+    This function will create the lookup tables of the filter and haplotype
+    stages, by running filter_dict_parent_reference /
+    filter_dict_sibling_reference and add_haplotype_parent_reference /
+    add_haplotype_children_reference on every (reference, child) genotype
+    pair, so the tables give the same results as these functions.
+    Pairs with an unknown genotype (non-biallelic or missing, e.g. "1|2",
+    ".|." or "0|.") are always filtered. The dict functions keep some of
+    them (e.g. a "1|2" reference counts as heterozygous), with a haplotype
+    that doesn't describe the inheritance, so this is where the two paths
+    differ.
+    :return: (keep table, haplotype table), flat arrays indexed by
+    reference code * NUM_GENOTYPE_CODES + child code (see
+    genotype_pair_indices)
+    """
+    pairs_dict = {genotype_pair_index(reference_code, child_code):
+                  [reference, child]
+                  for reference, reference_code in GENOTYPE_CODES.items()
+                  for child, child_code in GENOTYPE_CODES.items()}
+    if reference_type == PARENT_REFERENCE:
+        filtered_dict = filter_dict_parent_reference(pairs_dict)
+        add_haplotype_parent_reference(filtered_dict)
+    else:
+        filtered_dict = filter_dict_sibling_reference(pairs_dict)
+        add_haplotype_children_reference(filtered_dict)
+    keep_table = np.zeros(NUM_GENOTYPE_CODES ** 2, dtype=bool)
+    haplotype_table = np.zeros(NUM_GENOTYPE_CODES ** 2, dtype=np.int8)
+    for pair_index, values in filtered_dict.items():
+        keep_table[pair_index] = True
+        haplotype_table[pair_index] = values[2]
+    return keep_table, haplotype_table
+
+
+def genotype_pair_index(reference_code, child_code):
+    return reference_code * NUM_GENOTYPE_CODES + child_code
+
+
+def genotype_pair_indices(reference_codes, child_codes):
+    """
+    This function will return the index of every (reference, child) pair of
+    encoded genotypes in the tables of create_genotype_pair_tables
+    """
+    return reference_codes.astype(np.intp) * NUM_GENOTYPE_CODES + child_codes
+
+
+def filter_genotype_pairs(reference_codes, child_codes, reference_type):
+    """
+    This function will run the filter and haplotype stages on encoded
+    genotypes (arrays of any shape), with a lookup in the tables of
+    GENOTYPE_PAIR_TABLES:
+    1 - the left side of the reference equals the left side of the child
+    2 - otherwise (the right side of the reference is inherited)
+    0 - only for sibling reference, opposite homozygous siblings
+    :return: (boolean mask of the variants to keep, the haplotypes of the
+    variants kept)
+    """
+    keep_table, haplotype_table = GENOTYPE_PAIR_TABLES[reference_type]
+    pair_indices = genotype_pair_indices(reference_codes, child_codes)
+    keep = keep_table[pair_indices]
+    return keep, haplotype_table[pair_indices[keep]]
+
+
+def filter_children_genotypes(family_matrix, reference_type, parameters,
+                              child_numbers=None):
+    """
+    This function will run the filter, haplotype and confidence stages on
+    all the children of a family matrix (or the children of child_numbers)
+    at once, for many (window size, error size) pairs.
+    The genotypes of the children are taken as a (children x variants)
+    matrix, so the filter and haplotype stages are a single lookup (see
+    filter_genotype_pairs). The variants kept are flattened child after
+    child, and the confidence of all the children and window sizes is
+    calculated together, with windows that never cross to the next child
+    (see segment_window_confidence_grid). Every error size is applied as a
+    mask over the confidence of its window size.
+    :return: dict of (window size, error size) (key): list of the arrays of
+    the (positions, haplotypes, confidence) of the variants left after the
+    filters, for every child (value)
+    """
+    genotypes = family_matrix['genotypes']
+    if child_numbers is None:
+        child_numbers = range(1, genotypes.shape[1])
+    children_codes = genotypes[:, list(child_numbers)].T
+    keep, haplotypes = filter_genotype_pairs(genotypes[:, 0], children_codes,
+                                             reference_type)
+    positions = np.broadcast_to(family_matrix['positions'], keep.shape)[keep]
+    children_kept = np.count_nonzero(keep, axis=1)
+    children_ends = np.cumsum(children_kept)
+    # keep has a row for every child, so the (child, variant) pairs are
+    # counted separately from the variants
+    add_count("variants", keep.shape[-1])
+    add_count("child_variants", keep.size)
+    add_count("child_variants_after_genotype_filter", len(positions))
+    window_sizes = {window_size for window_size, _ in parameters}
+    confidence_grid = segment_window_confidence_grid(
+        haplotypes, np.repeat(children_ends, children_kept), window_sizes)
+    filter_results = {}
+    for window_size, error_size in parameters:
+        confidence = confidence_grid[window_size]
+        high_score = confidence > error_size
+        add_count("child_variants_after_confidence_filter",
+                  np.count_nonzero(high_score))
+        # The number of variants left up to the end of every child
+        high_score_cumulative = np.zeros(len(high_score) + 1, dtype=np.int64)
+        np.cumsum(high_score, out=high_score_cumulative[1:])
+        child_splits = high_score_cumulative[children_ends]
+        # The last split is the empty remainder after the last child
+        filter_results[(window_size, error_size)] = list(zip(
+            *(np.split(values[high_score], child_splits)[:-1]
+              for values in (positions, haplotypes, confidence))))
+    return filter_results
+
+
 def create_common_cancer_genes_dict(file_path):
     """
     This function will create the mentioned dict in the following format:
@@ -105,34 +224,84 @@ def create_common_cancer_genes_dict(file_path):
     return common_genes_dict
 
 
-def update_cancer_variant_dict(shared_interval_list, variants_dict):
+def create_genes_index(common_genes_dict):
+    """
+    This function will create a per chromosome index of the genes in the
+    dict given (as created by create_common_cancer_genes_dict), in the
+    following format:
+    chromosome (key): {"starts": , "ends": , "names": } (value)
+    where the genes of each chromosome are sorted by their start position.
+    The index is created once and used by update_cancer_variant_dict.
+    """
+    chromosome_genes = {}
+    for variant_name, variant_info in common_genes_dict.items():
+        chromosome, start_position, end_position = variant_info[:3]
+        chromosome_genes.setdefault(chromosome, []).append(
+            (start_position, end_position, variant_name))
+    genes_index = {}
+    for chromosome, genes in chromosome_genes.items():
+        genes.sort()
+        genes_index[chromosome] = {
+            "starts": np.array([gene[0] for gene in genes], dtype=np.int64),
+            "ends": np.array([gene[1] for gene in genes], dtype=np.int64),
+            "names": [gene[2] for gene in genes]}
+    return genes_index
+
+
+def genes_in_intervals(chromosome_genes, interval_list):
+    """
+    This function will return the names of the genes (from a single
+    chromosome of the genes index) that are fully contained in one of the
+    intervals given.
+    For every gene, the candidate intervals are those starting at or before
+    the gene, and the gene is contained if the furthest end among them is at
+    or after the end of the gene.
+    """
+    interval_starts = interval_list['start'].astype(np.int64)
+    interval_ends = interval_list['end'].astype(np.int64)
+    order = np.argsort(interval_starts, kind='stable')
+    interval_starts = interval_starts[order]
+    furthest_ends = np.maximum.accumulate(interval_ends[order])
+    # Only genes that start inside the span of the intervals can be contained
+    first_gene = np.searchsorted(chromosome_genes["starts"],
+                                 interval_starts[0], side='left')
+    last_gene = np.searchsorted(chromosome_genes["starts"],
+                                furthest_ends[-1], side='right')
+    gene_starts = chromosome_genes["starts"][first_gene:last_gene]
+    gene_ends = chromosome_genes["ends"][first_gene:last_gene]
+    candidates = np.searchsorted(interval_starts, gene_starts,
+                                 side='right') - 1
+    is_contained = furthest_ends[candidates] >= gene_ends
+    return [chromosome_genes["names"][first_gene + gene_number]
+            for gene_number in np.flatnonzero(is_contained)]
+
+
+def update_cancer_variant_dict(shared_interval_list, chromosome,
+                               variants_dict, genes_index=None):
     """
     This function will update the dict that contains known genes related
     to cancer.
     If one of the genes is in one of the common intervals of the patients
-    in a family given, it will update the gene to True in value[3]
-    """
-    for variant_name, variant_info in variants_dict.items():
-        # Checking that the interval list is not empty
-        if not shared_interval_list:
-            break
-        chromosome, variant_start_position, variant_end_position, \
-            is_in_common_interval = variant_info
-        # Skip irrelevant chromosomes- all intervals have the same chromosome
-        cur_chromosome = int(shared_interval_list[0]['chromosome'])
-        if cur_chromosome in [1, *range(3, 11), 12, 14, 15, range(18, 22)]:
-            break
-        # Check if the variant is in any common interval
-        if not is_in_common_interval:
-            is_in_common_interval = any(
-                interval['chromosome'] == chromosome and
-                (variant_end_position <= interval['end'] and
-                 variant_start_position >= interval['start'])
-                for interval in shared_interval_list
-            )
+    in a family given (the shared intervals of a single chromosome), it will
+    update the gene to True in value[3]
+    The genes are looked up in genes_index (created by create_genes_index
+    if not given).
+    """
+    # Checking that the interval list is not empty
+    if len(shared_interval_list) == 0:
+        return
+    if genes_index is None:
+        genes_index = create_genes_index(variants_dict)
+    if str(chromosome) not in genes_index:
+        return
+    for variant_name in genes_in_intervals(genes_index[str(chromosome)],
+                                           shared_interval_list):
+        gene_chromosome, variant_start_position, variant_end_position, _ = \
+            variants_dict[variant_name]
         # Update the boolean value in the variant_info
-        variants_dict[variant_name] = [chromosome, variant_start_position,
-                                       variant_end_position, is_in_common_interval]
+        variants_dict[variant_name] = [gene_chromosome,
+                                       variant_start_position,
+                                       variant_end_position, True]
 
 
 def add_haplotype_parent_reference(my_dict):
@@ -172,6 +341,66 @@ def add_haplotype_children_reference(my_dict):
             values.append(2)
 
 
+def window_confidence(haplotypes, window_size):
+    """
+    This function will calculate the confidence of every variant in a single
+    pass over the haplotype sequence given.
+    The confidence of a variant is the number of variants among itself and
+    the next window_size - 1 variants that have the same haplotype.
+    :return: numpy array with the confidence of each variant
+    """
+    return window_confidence_grid(haplotypes, [window_size])[window_size]
+
+
+def window_confidence_grid(haplotypes, window_sizes):
+    """
+    This function will calculate the confidence of every variant (as in
+    window_confidence) for several window sizes at once, as a single
+    segment of segment_window_confidence_grid.
+    :return: dict of window size (key): numpy array with the confidence of
+    each variant (value)
+    """
+    haplotypes = np.asarray(haplotypes)
+    return segment_window_confidence_grid(
+        haplotypes, np.full(len(haplotypes), len(haplotypes)), window_sizes)
+
+
+def segment_window_confidence_grid(haplotypes, segment_ends, window_sizes):
+    """
+    This function will calculate the confidence of every variant (as in
+    window_confidence) of many haplotype sequences concatenated together,
+    for several window sizes at once. The window of a variant ends at the
+    end of its own sequence (segment).
+    For each haplotype value, a cumulative count of its occurrences is kept,
+    so the count of a window is the difference of two cumulative values.
+    The cumulative counts are calculated once, and shared by all the window
+    sizes.
+    haplotypes - numpy array of the haplotype codes (0, 1 or 2)
+    segment_ends - numpy array of the end index of the segment of every
+    variant
+    :return: dict of window size (key): numpy array with the confidence of
+    each variant (value)
+    """
+    num_variants = len(haplotypes)
+    confidence_grid = {window_size: np.ones(num_variants, dtype=np.int64)
+                       for window_size in window_sizes}
+    indices = np.arange(num_variants)
+    for code in np.unique(haplotypes):
+        is_code = haplotypes == code
+        cumulative = np.zeros(num_variants + 1, dtype=np.int64)
+        np.cumsum(is_code, out=cumulative[1:])
+        code_indices = indices[is_code]
+        code_segment_ends = segment_ends[is_code]
+        for window_size, confidence in confidence_grid.items():
+            if window_size <= 1:
+                continue
+            window_ends = np.minimum(code_indices + window_size,
+                                     code_segment_ends)
+            confidence[code_indices] = (cumulative[window_ends] -
+                                        cumulative[code_indices])
+    return confidence_grid
+
+
 def add_confidence(my_dict, window_size):
     """
     This function will add the confidence value to the dict
@@ -179,24 +408,9 @@ def add_confidence(my_dict, window_size):
     variant, in a given window - the size of the window is determined by
     the user
     """
-    for position, values in my_dict.items():
-        haplotype = values[-1]  # Get the haplotype for the current position
-        count = 1
-        count_window = 1
-        keys_iterator = iter(my_dict.keys())
-        next_position = next(keys_iterator)
-        # Skip positions until the current position in the outer loop
-        while next_position != position:
-            next_position = next(keys_iterator)
-        for next_position in islice(keys_iterator, window_size):
-            if count_window == window_size:
-                break
-            else:
-                count_window += 1
-                next_haplotype = my_dict[next_position][-1]
-                if haplotype == next_haplotype:
-                    # If they match, increment the count
-                    count += 1
+    haplotypes = [values[-1] for values in my_dict.values()]
+    confidence = window_confidence(haplotypes, window_size)
+    for values, count in zip(my_dict.values(), confidence.tolist()):
         values.append(count)
 
 
@@ -224,3 +438,10 @@ def filter_low_score(data_dict, error_size):
         if value[-1] > error_size:
             filtered_dict[key] = value
     return filtered_dict
+
+
+# (keep table, haplotype table) of every reference type, see
+# create_genotype_pair_tables
+GENOTYPE_PAIR_TABLES = {
+    reference_type: create_genotype_pair_tables(reference_type)
+    for reference_type in (PARENT_REFERENCE, SIBLING_REFERENCE)}
@@ -0,0 +1,264 @@
+from array import array
+from itertools import chain
+
+import numpy as np
+
+from compressed_files import open_text
+
+# Every phased genotype is packed into a single code, where the left allele
+# is the high bit and the right allele is the low bit
+GENOTYPE_CODES = {"0|0": 0, "0|1": 1, "1|0": 2, "1|1": 3}
+# Any other genotype (e.g. multi-allelic "1|2") gets this code
+UNKNOWN_GENOTYPE = 4
+# A genotype column in the text files, including the tab after it
+GENOTYPE_FIELD_WIDTH = 4
+UNKNOWN_FIELD = "?|?"
+# The genotype text of a chromosome is encoded whenever this many bytes of
+# it are buffered, so the text of a whole chromosome is never held at once
+ENCODE_CHUNK_SIZE = 1 << 20
+
+
+def create_family_matrix(chromosome, positions, genotypes, samples):
+    """
+    This function will create the columnar model of a single chromosome of a
+    family, in the following format:
+    chromosome - the chromosome name
+    positions - uint32 array of the variants positions
+    genotypes - int8 array of genotype codes, one row per variant and one
+    column per sample (the reference is column 0, the children follow)
+    samples - the sample names, in the order of the genotype columns
+    """
+    return {"chromosome": chromosome,
+            "positions": positions,
+            "genotypes": genotypes,
+            "samples": samples}
+
+
+def encode_genotype_text(genotype_text, num_samples, unphased=False):
+    """
+    This function will encode the genotype columns of many variants at once.
+    genotype_text is the ascii text of the genotype columns, where every
+    column is 3 characters long and followed by a tab, so each variant takes
+    exactly GENOTYPE_FIELD_WIDTH * num_samples bytes.
+    If unphased, unphased genotypes (e.g. "0/1" or "./.") are encoded the
+    way preprocess_file replaces them, otherwise they are unknown.
+    :return: int8 array of the genotype codes (variants x samples)
+    """
+    row_width = GENOTYPE_FIELD_WIDTH * num_samples
+    text = np.frombuffer(genotype_text, dtype=np.uint8)
+    text = text.reshape(len(text) // row_width, row_width)
+    left_alleles = text[:, 0::GENOTYPE_FIELD_WIDTH] - ord('0')
+    separators = text[:, 1::GENOTYPE_FIELD_WIDTH]
+    right_alleles = text[:, 2::GENOTYPE_FIELD_WIDTH] - ord('0')
+    # The alleles were shifted to unsigned values, so '0' and '1' are 0 and 1
+    is_known = (left_alleles <= 1) & (right_alleles <= 1) & \
+               (separators == ord('|'))
+    if unphased:
+        left_alleles, right_alleles, is_unphased_known = \
+            encode_unphased_alleles(left_alleles, separators, right_alleles)
+        is_known |= is_unphased_known
+    genotypes = (left_alleles * 2 + right_alleles).astype(np.int8)
+    genotypes[~is_known] = UNKNOWN_GENOTYPE
+    return genotypes
+
+
+def encode_unphased_alleles(left_alleles, separators, right_alleles):
+    """
+    This function will read the alleles of unphased genotypes the way
+    preprocess_file replaces them - "./." is 0|0, "./1" is 0|1, "1/." is
+    1|0, and "a/b" is a|b. Other missing alleles ("0/." and "./0") are not
+    replaced, so they stay unknown.
+    :return: the (left alleles, right alleles) with the missing alleles of
+    the replaced genotypes set to 0, and a mask of the replaced genotypes
+    """
+    # The alleles were shifted to unsigned values, so '.' wraps around
+    missing_allele = np.uint8((ord('.') - ord('0')) % 256)
+    is_unphased = separators == ord('/')
+    left_missing = left_alleles == missing_allele
+    right_missing = right_alleles == missing_allele
+    is_replaced = is_unphased & \
+        ((left_alleles <= 1) | left_missing) & \
+        ((right_alleles <= 1) | right_missing) & \
+        ~(left_missing & (right_alleles == 0)) & \
+        ~(right_missing & (left_alleles == 0))
+    left_alleles = np.where(is_unphased & left_missing, 0, left_alleles)
+    right_alleles = np.where(is_unphased & right_missing, 0, right_alleles)
+    return left_alleles, right_alleles, is_replaced
+
+
+def normalize_genotype_text(genotype_text):
+    """
+    This function will replace genotype columns that are not 3 characters
+    long with UNKNOWN_FIELD, so the text can be encoded by
+    encode_genotype_text
+    """
+    return '\t'.join(genotype if len(genotype) == 3 else UNKNOWN_FIELD
+                     for genotype in genotype_text.split('\t'))
+
+
+def align_genotype_text(genotype_text, num_samples, file_path=""):
+    """
+    This function will normalize (see normalize_genotype_text), in place,
+    the rows of the genotype text given (as given to encode_genotype_text)
+    that have the right length but a column of another width.
+    Their tabs are out of place, so encode_genotype_text would read their
+    columns from the wrong offsets.
+    """
+    row_width = GENOTYPE_FIELD_WIDTH * num_samples
+    rows = np.frombuffer(genotype_text, dtype=np.uint8).reshape(-1, row_width)
+    separators = rows[:, GENOTYPE_FIELD_WIDTH - 1::GENOTYPE_FIELD_WIDTH]
+    for row in np.flatnonzero(np.any(separators != ord('\t'),
+                                     axis=1)).tolist():
+        row_text = rows[row].tobytes().decode('ascii')[:-1]
+        normalized_text = normalize_genotype_text(row_text)
+        if len(normalized_text) != row_width - 1:
+            raise ValueError(f"{file_path}: expected {num_samples} "
+                             f"genotype columns in: {row_text}")
+        rows[row, :-1] = np.frombuffer(normalized_text.encode('ascii'),
+                                       dtype=np.uint8)
+
+
+def encode_chromosome_text(genotype_text, num_samples, unphased=False,
+                           file_path=""):
+    """
+    This function will encode the genotype text buffered for a chromosome by
+    create_family_matrices, after aligning its rows (see
+    align_genotype_text)
+    """
+    align_genotype_text(genotype_text, num_samples, file_path)
+    return encode_genotype_text(genotype_text, num_samples, unphased)
+
+
+def merge_duplicate_positions(positions, genotypes):
+    """
+    This function will keep a single row for each position, the same way a
+    dict keyed by position does - the last row of a position is kept, in the
+    place of the first row of that position
+    """
+    unique_positions, first_rows = np.unique(positions, return_index=True)
+    if len(unique_positions) == len(positions):
+        return positions, genotypes
+    reversed_positions = positions[::-1]
+    _, last_rows_reversed = np.unique(reversed_positions, return_index=True)
+    last_rows = len(positions) - 1 - last_rows_reversed
+    order = np.argsort(first_rows, kind='stable')
+    return unique_positions[order], genotypes[last_rows[order]]
+
+
+def invert_family_matrix(family_matrix):
+    """
+    This function will return a new family matrix where the reference
+    genotypes are inverted the same way as invert_reference_genome_haplotype,
+    according to the first child:
+    reference - 0|1 child - 1|1, the reference will be inverted to 1|0
+    reference - 1|0 child - 0|0, the reference will be inverted to 0|1
+    """
+    genotypes = family_matrix['genotypes'].copy()
+    reference_codes = genotypes[:, 0]
+    child_codes = genotypes[:, 1]
+    invert_to_left = (reference_codes == GENOTYPE_CODES['0|1']) & \
+                     (child_codes == GENOTYPE_CODES['1|1'])
+    invert_to_right = (reference_codes == GENOTYPE_CODES['1|0']) & \
+                      (child_codes == GENOTYPE_CODES['0|0'])
+    reference_codes[invert_to_left] = GENOTYPE_CODES['1|0']
+    reference_codes[invert_to_right] = GENOTYPE_CODES['0|1']
+    return create_family_matrix(family_matrix['chromosome'],
+                                family_matrix['positions'], genotypes,
+                                family_matrix['samples'])
+
+
+def read_family_matrices(file_path, first_sample_column=4):
+    """
+    This function will read a family file (or a chromosome file), and create
+    a family matrix for every chromosome in it.
+    The first line of the file is the header, and the genotype columns start
+    at first_sample_column (the reference, followed by the children)
+    :return: dict of chromosome (key): family matrix (value), in the order of
+    the chromosomes in the file
+    The file may be gzip/BGZF compressed.
+    """
+    with open_text(file_path) as file:
+        return create_family_matrices(file, first_sample_column, file_path)
+
+
+def create_family_matrices(lines, first_sample_column=4, file_path="",
+                           unphased=False):
+    """
+    This function will create the family matrices (as read_family_matrices)
+    from the lines given, where the first line is the header
+    If unphased, the unphased genotypes are encoded as preprocess_file
+    replaces them (see encode_genotype_text).
+    The genotype text of every chromosome is encoded in chunks of
+    ENCODE_CHUNK_SIZE bytes while the lines are read. Only the length of a
+    row is checked when it is read, its columns are aligned when its chunk
+    is encoded (see encode_chromosome_text).
+    """
+    samples = None
+    chromosome_rows = {}
+    for line in lines:
+        columns = line.strip().split('\t', first_sample_column)
+        if samples is None:
+            samples = columns[first_sample_column].split('\t')
+            row_length = GENOTYPE_FIELD_WIDTH * len(samples) - 1
+            continue
+        if columns[0] == "CHROM" or len(columns) <= first_sample_column:
+            continue
+        chromosome = columns[0]
+        genotype_text = columns[first_sample_column]
+        if len(genotype_text) != row_length:
+            genotype_text = normalize_genotype_text(genotype_text)
+            if len(genotype_text) != row_length:
+                raise ValueError(f"{file_path}: expected {len(samples)} "
+                                 f"genotype columns in line: {line}")
+        if chromosome not in chromosome_rows:
+            chromosome_rows[chromosome] = (array('I'), bytearray(), [])
+        positions, text, genotype_chunks = chromosome_rows[chromosome]
+        positions.append(int(columns[1]))
+        text += genotype_text.encode('ascii')
+        text += b'\t'
+        if len(text) >= ENCODE_CHUNK_SIZE:
+            genotype_chunks.append(encode_chromosome_text(
+                text, len(samples), unphased, file_path))
+            text.clear()
+    family_matrices = {}
+    for chromosome, (positions, text, genotype_chunks) in \
+            chromosome_rows.items():
+        positions = np.frombuffer(positions, dtype=np.uint32)
+        if text:
+            genotype_chunks.append(encode_chromosome_text(
+                text, len(samples), unphased, file_path))
+        genotypes = np.concatenate(genotype_chunks)
+        positions, genotypes = merge_duplicate_positions(positions, genotypes)
+        family_matrices[chromosome] = create_family_matrix(
+            chromosome, positions, genotypes, samples)
+    return family_matrices
+
+
+def read_family_matrix(file_path, first_sample_column=4):
+    """
+    This function will read a file of a single chromosome into a family
+    matrix. If the file has no variants, the matrix will be empty.
+    The file may be gzip/BGZF compressed.
+    """
+    with open_text(file_path) as file:
+        return create_chromosome_matrix(file, first_sample_column, file_path)
+
+
+def create_chromosome_matrix(lines, first_sample_column=4, file_path=""):
+    """
+    This function will create the family matrix of a single chromosome from
+    the lines given, where the first line is the header
+    """
+    lines = iter(lines)
+    header_line = next(lines, "")
+    family_matrices = create_family_matrices(chain([header_line], lines),
+                                             first_sample_column, file_path)
+    if len(family_matrices) > 1:
+        raise ValueError(f"{file_path} contains more than one chromosome: "
+                         f"{', '.join(family_matrices)}")
+    if family_matrices:
+        return next(iter(family_matrices.values()))
+    samples = header_line.strip().split('\t')[first_sample_column:]
+    return create_family_matrix(None, np.zeros(0, dtype=np.uint32),
+                                np.zeros((0, len(samples)), dtype=np.int8),
+                                samples)
@@ -1,73 +1,215 @@
 import os
+import re
 import tempfile
+from itertools import chain
 
-import pandas as pd
+import numpy as np
+
+from compressed_files import *
+from family_matrix import create_chromosome_matrix, create_family_matrices
+from run_report import report_stage
 
 replacements = {"./.": "0|0", "./1": "0|1", "1/.": "1|0", "1/1": "1|1",
                 "1/0": "1|0", "0/1": "0|1", "0/0": "0|0"}
+# The genotype columns start at the 5th column
+FIRST_GENOTYPE_COLUMN = 4
+# Genotype columns of 3 characters - an allele, a separator and an allele
+SIMPLE_GENOTYPES_PATTERN = re.compile(r'[01.][/|][01.](?:\t[01.][/|][01.])*')
+# The replacements of these columns, unless they have a "." in a phased
+# genotype, "0/." or "./0", which are not replaced
+UNPHASED_TRANSLATION = str.maketrans('/.', '|0')
+WRITE_BUFFER_SIZE = 1 << 20
+PREPROCESS_CHUNK_SIZE = 1 << 20
+# The number of genotype texts remembered by preprocess_line
+MAX_REPLACED_GENOTYPES = 1 << 16
+SPLIT_BUFFER_SIZE = 1 << 24
+CHROMOSOME_INDEX_FILE_NAME = "chromosome_index.tsv"
+REGION_INDEX_SUFFIX = ".regions.tsv"
+REGION_BIN_SIZE = 100000
 
 
-def preprocess_file(input_file_path, output_directory):
+def replace_genotypes(genotype_text):
+    """
+    This function will replace the genotypes in the genotype columns text
+    given (see replacements).
+    When every column is 3 characters - an allele (0, 1 or .), a separator
+    and an allele - and the only missing alleles are in replaced genotypes,
+    the replacements are the same as changing '/' to '|' and '.' to '0', so
+    the whole text is translated at once. Otherwise, every column is
+    replaced on its own.
+    """
+    if SIMPLE_GENOTYPES_PATTERN.fullmatch(genotype_text) and \
+            "0/." not in genotype_text and "./0" not in genotype_text and \
+            ".|" not in genotype_text and "|." not in genotype_text:
+        return genotype_text.translate(UNPHASED_TRANSLATION)
+    replace = replacements.get
+    return '\t'.join([replace(genotype, genotype) for genotype in
+                      genotype_text.split('\t')])
+
+
+def preprocess_line(line, replaced_genotypes=None):
+    """
+    This function will preprocess a single line of the file, replacing the
+    genotypes from the 5th column onward. Lines without unphased genotypes
+    (no '/') are returned as is.
+    replaced_genotypes is an optional dict of genotype columns text (key):
+    its replacement (value), shared by the lines of a file - the genotypes
+    of a family repeat often, so most lines are replaced with a single
+    lookup. It holds up to MAX_REPLACED_GENOTYPES entries.
+    """
+    line = line.strip()
+    columns = line.split('\t', FIRST_GENOTYPE_COLUMN)
+    if len(columns) <= FIRST_GENOTYPE_COLUMN or \
+            '/' not in columns[FIRST_GENOTYPE_COLUMN]:
+        return line
+    genotype_text = columns[FIRST_GENOTYPE_COLUMN]
+    if replaced_genotypes is None:
+        replaced_genotypes = {}
+    replaced_text = replaced_genotypes.get(genotype_text)
+    if replaced_text is None:
+        replaced_text = replace_genotypes(genotype_text)
+        if len(replaced_genotypes) < MAX_REPLACED_GENOTYPES:
+            replaced_genotypes[genotype_text] = replaced_text
+    columns[FIRST_GENOTYPE_COLUMN] = replaced_text
+    return '\t'.join(columns)
+
+
+def preprocess_file(input_file_path, output_directory, compress=False):
     """
     This function will preprocess the file given:
     Changing "./." to 0/0, or "./1" to 0/1 etc. and save the result in a new
     file.
+    The file is streamed line by line, so the memory used doesn't depend on
+    the size of the file.
+    The input file may be gzip/BGZF compressed, and the result is BGZF
+    compressed if compress.
     """
-    with open(input_file_path, 'r') as file:
-        lines = file.readlines()
-    processed_lines = []
-    header_index = None
-    for i, line in enumerate(lines):
-        if line.startswith("#CHROM"):
-            header_index = i
-            break
-    if header_index is not None:
-        header_line = lines[header_index].strip().replace("#", "")
-        processed_lines.append(header_line)
-        # Process lines after the header
-        for line in lines[header_index + 1:]:
-            columns = line.strip().split('\t')
-            # Process each column starting from the 5th column
-            for i in range(4, len(columns)):
-                # Replace values based on the dictionary
-                columns[i] = replacements.get(columns[i], columns[i])
-            processed_line = '\t'.join(columns)
-            processed_lines.append(processed_line)
-        result = '\n'.join(processed_lines)
-        input_file_name = os.path.basename(input_file_path)
-        output_file_name = "processed_" + input_file_name
-        output_file_path = os.path.join(output_directory, output_file_name)
-        with open(output_file_path, 'w') as output_file:
-            output_file.write(result)
+    with open_text(input_file_path) as file:
+        header_line = read_raw_header(file)
+        if header_line is None:
+            return None
+        output_file_path = preprocessed_file_path(input_file_path,
+                                                  output_directory, compress)
+        with open_text(output_file_path, 'w',
+                       buffering=WRITE_BUFFER_SIZE) as output_file:
+            output_file.write(header_line)
+            # Process lines after the header, a chunk of lines at a time
+            for processed_lines in preprocessed_chunks(file):
+                output_file.write('\n')
+                output_file.write('\n'.join(processed_lines))
         return output_file_path
 
 
-def merge_haplotype_tables(input_directory, chromosome_coverage_dict,
-                           window_size, error_size, invert):
+def preprocessed_chunks(file):
+    """
+    This function will yield the lines left in the file given, preprocessed
+    (see preprocess_line), in lists of about PREPROCESS_CHUNK_SIZE bytes of
+    lines, so they are written with a single write for every chunk
+    """
+    replaced_genotypes = {}
+    while True:
+        lines = file.readlines(PREPROCESS_CHUNK_SIZE)
+        if not lines:
+            return
+        yield [preprocess_line(line, replaced_genotypes) for line in lines]
+
+
+def read_raw_header(file):
+    """
+    This function will skip the lines of a raw family file up to its #CHROM
+    header line (e.g. the ## meta lines)
+    :return: the header line without the '#', or None if the file has no
+    header line
+    """
+    for line in file:
+        if line.startswith("#CHROM"):
+            return line.strip().replace("#", "")
+    return None
+
+
+def preprocessed_file_path(input_file_path, output_directory, compress=False):
+    input_file_name = uncompressed_name(os.path.basename(input_file_path))
+    return compressed_path(os.path.join(output_directory,
+                                        "processed_" + input_file_name),
+                           compress)
+
+
+def write_preprocessed_lines(file, output_file):
+    """
+    This function will preprocess the lines left in the file given (the
+    lines after the header), write them to output_file as preprocess_file
+    does, and yield them
+    """
+    for processed_lines in preprocessed_chunks(file):
+        output_file.write('\n')
+        output_file.write('\n'.join(processed_lines))
+        yield from processed_lines
+
+
+def read_raw_family_matrices(input_file_path, output_directory=None,
+                             compress=False):
+    """
+    This function will read a raw family file (the input of preprocess_file)
+    straight into the family matrices of its chromosomes, in a single pass:
+    the unphased genotypes are replaced while they are encoded, and the
+    variants go to the matrix of their chromosome, so the result is the
+    same as read_family_matrices of the preprocessed file, without writing
+    the preprocessed file and the chromosome files.
+    If output_directory is given, the preprocessed file is written there as
+    well (as preprocess_file, BGZF compressed if compress).
+    :return: dict of chromosome (key): family matrix (value)
     """
-    This function will merge all the tables given in the input_directory
+    with open_text(input_file_path) as file:
+        header_line = read_raw_header(file)
+        if header_line is None:
+            raise ValueError(f"{input_file_path} has no #CHROM header line")
+        if output_directory is None:
+            return create_family_matrices(chain([header_line], file),
+                                          FIRST_GENOTYPE_COLUMN,
+                                          input_file_path, unphased=True)
+        output_file_path = preprocessed_file_path(input_file_path,
+                                                  output_directory, compress)
+        with open_text(output_file_path, 'w',
+                       buffering=WRITE_BUFFER_SIZE) as output_file:
+            output_file.write(header_line)
+            return create_family_matrices(
+                chain([header_line],
+                      write_preprocessed_lines(file, output_file)),
+                FIRST_GENOTYPE_COLUMN, output_file_path)
+
+
+def merge_haplotype_tables(output_directory, chromosome_intervals,
+                           chromosome_coverage_dict):
+    """
+    This function will merge the interval tables of all the chromosomes into
+    a single table in the output_directory
     The format will be as follows:
     CHROM START END HAPLOTYPE
     Specifying each interval's chromosome, location, and haplotype
+    The rows are created from chromosome_intervals - dict of chromosome
+    number: shared intervals (see shared_interval), the same rows
+    create_table writes, so the merged table doesn't depend on the table
+    files left in the output_directory.
+    A chromosome without shared intervals has no rows.
     """
     merged_intervals = []
     for chrom_num in range(1, 23):
-        file_path = (f"{input_directory}/table_{chrom_num}_"
-                     f"window_{window_size}_error_{error_size}_inverted_"
-                     f"{bool(invert)}.txt")
-        with open(file_path, 'r') as file:
-            for line in file:
-                columns = line.strip().split()
-                merged_intervals.append(columns)
+        if chrom_num not in chromosome_intervals:
+            continue
+        rows = table_rows(chrom_num, chromosome_intervals[chrom_num])
+        if not rows:
+            continue
         chrom_coverage = round(chromosome_coverage_dict[chrom_num] * 100, 1)
-        columns.append(str(chrom_coverage) + "%")
-    output_path_merged = f"{input_directory}/merged_haplotype_intervals.txt"
+        rows[-1].append(str(chrom_coverage) + "%")
+        merged_intervals.extend(rows)
+    os.makedirs(output_directory, exist_ok=True)
+    output_path_merged = f"{output_directory}/merged_haplotype_intervals.txt"
     with open(output_path_merged, 'w') as output_file:
         output_file.write("CHROM\tSTART\tEND\tHAPLOTYPE\tCERTAINTY\tCOVERAGE\n")
         # Write each merged interval to the output file
         for interval in merged_intervals:
             output_file.write('\t'.join(interval) + '\n')
-    output_path_excel = f"{input_directory}/merged_haplotype_Excel.xlsx"
+    output_path_excel = f"{output_directory}/merged_haplotype_Excel.xlsx"
     convert_txt_to_excel(output_path_merged, output_path_excel)
 
 
@@ -84,12 +226,26 @@ def write_common_genes_to_file(output_directory, cancer_genes_dict):
             output_file.write(f"{variant_name} - {variant_info[3]}\n")
 
     # Convert the common genes txt file to Excel
-    df = pd.read_csv(output_path_txt, delimiter='\t')
-    excel_output_path = f"{output_directory}/common_cancer_genes_Excel.xlsx"
-    df.to_excel(excel_output_path, index=False)
+    with report_stage("excel_export"):
+        import pandas as pd
+        df = pd.read_csv(output_path_txt, delimiter='\t')
+        excel_output_path = f"{output_directory}/common_cancer_genes_Excel.xlsx"
+        df.to_excel(excel_output_path, index=False)
 
 
-def create_table(data_list, output_directory, window_size, error_size, inverted):
+def table_file_path(output_directory, chromosome, window_size, error_size,
+                    inverted):
+    """
+    This function will return the path of the interval table of a chromosome
+    (as written by create_table)
+    """
+    return os.path.join(output_directory,
+                        f'table_{chromosome}_window_{window_size}'
+                        f'_error_{error_size}_inverted_{bool(inverted)}.txt')
+
+
+def create_table(data_list, output_directory, window_size, error_size, inverted,
+                 chromosome):
     """
     This function will create the shared haplotype intervals table
     The table will be in a new .txt file, ordered in the following format -
@@ -101,37 +257,40 @@ def create_table(data_list, output_directory, window_size, error_size, inverted)
     certainty_level - 1 for areas with the same haplotype,
     -1 for areas with opposing haplotypes
     the .txt file will be saved in the interval_tables directory
+    data_list is an array of the shared intervals of the chromosome given
+    (see shared_interval). The table is written even if there are no
+    intervals (an empty table), so the table of an earlier run in the same
+    output_directory isn't left behind.
     """
     os.makedirs(output_directory, exist_ok=True)
-    # Group data by chromosome
-    grouped_data = {}
-    for entry in data_list:
-        chromosome = entry['chromosome']
-        if chromosome not in grouped_data:
-            grouped_data[chromosome] = []
-        grouped_data[chromosome].append(entry)
-    # Write data for each chromosome
-    for chromosome, chromosome_data in grouped_data.items():
-        data_list_reordered = [
-            {k: entry[k] for k in ['chromosome', 'start', 'end', 'haplotype']}
-            for entry in chromosome_data]
-        # Calculate certainty level
-        for entry in data_list_reordered:
-            entry['certainty_level'] = -1 if (entry['haplotype'] ==
-                                              chromosome_data[0]['haplotype']
-                                              or entry['haplotype'] == 0) else 1
-        file_path = os.path.join(output_directory,
-                                 f'table_{chromosome}_window_{window_size}'
-                                 f'_error_{error_size}_inverted_'
-                                 f'{bool(inverted)}.txt')
-        with open(file_path, 'w') as file:
-            for entry in data_list_reordered:
-                file.write(f"{entry['chromosome']}\t{entry['start']}\t"
-                           f"{entry['end']}\t{entry['haplotype']}\t"
-                           f"{entry['certainty_level']}\n")
-
-
-def invert_reference_genome_haplotype(input_file, output_directory):
+    file_path = table_file_path(output_directory, chromosome, window_size,
+                                error_size, inverted)
+    with open(file_path, 'w') as file:
+        file.write(''.join('\t'.join(row) + '\n'
+                           for row in table_rows(chromosome, data_list)))
+
+
+def table_rows(chromosome, interval_list):
+    """
+    This function will return the rows of the interval table of a single
+    chromosome (see create_table), as lists of the column strings
+    """
+    if not len(interval_list):
+        return []
+    haplotypes = interval_list['haplotype']
+    # Calculate certainty level
+    certainty_levels = np.where((haplotypes == haplotypes[0]) |
+                                (haplotypes == 0), -1, 1)
+    return [[str(chromosome), str(start), str(end), str(haplotype),
+             str(certainty_level)]
+            for start, end, haplotype, certainty_level in
+            zip(interval_list['start'].tolist(),
+                interval_list['end'].tolist(), haplotypes.tolist(),
+                certainty_levels.tolist())]
+
+
+def invert_reference_genome_haplotype(input_file, output_directory,
+                                      compress=False):
     """
     This function will create a new file from the file given, that will contain
     the inverted variants (if needed) of the reference genotype
@@ -142,9 +301,11 @@ def invert_reference_genome_haplotype(input_file, output_directory):
     will be ignored
     In other words, the reference will always inherit the left side (haplotype =
     1)
+    The input file may be gzip/BGZF compressed, and the new file is BGZF
+    compressed if compress.
     """
     inverted_lines = []
-    with open(input_file, 'r') as file:
+    with open_text(input_file) as file:
         header = file.readline().strip()
         inverted_lines.append(header)
         for line in file:
@@ -163,61 +324,409 @@ def invert_reference_genome_haplotype(input_file, output_directory):
                 columns[4] = '0|1'
             inverted_lines.append('\t'.join(columns))
     os.makedirs(output_directory, exist_ok=True)
-    output_file_name = "inverted_" + os.path.basename(input_file)
-    output_file_path = os.path.join(output_directory, output_file_name)
-    with open(output_file_path, 'w') as output_file:
+    output_file_name = "inverted_" + uncompressed_name(
+        os.path.basename(input_file))
+    output_file_path = compressed_path(
+        os.path.join(output_directory, output_file_name), compress)
+    with open_text(output_file_path, 'w') as output_file:
         output_file.write('\n'.join(inverted_lines))
     return output_file_path
 
 
-def open_and_split_children_files(file_path):
+def open_and_split_children_files(file_path, output_directory=None):
     """
     This function will open the file and split it into n files.
     Each file will contain column[0] column[1], column[4], and subsequent
     columns from 5 to the last column.
     The number of child files will be determined based on the available
     columns.
+    The file is read once, and all the child files are written together.
+    If output_directory is given, the child files are saved there (for
+    debugging), otherwise temporary files are created.
     """
-    child_filenames = []
-    with open(file_path, 'r') as infile:
+    with open_text(file_path) as infile:
         header_columns = infile.readline().strip().split('\t')
         # Determine the number of child files based on available columns
         num_children = len(header_columns) - 5
-        for child_num in range(1, num_children + 1):
-            with tempfile.NamedTemporaryFile(
-                    mode='w+', delete=False) as child_file:
-                child_filenames.append(child_file.name)
+        if output_directory is not None:
+            os.makedirs(output_directory, exist_ok=True)
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            child_files = [
+                open(os.path.join(output_directory,
+                                  f"{base_name}_child_{child_num}.txt"), 'w')
+                for child_num in range(1, num_children + 1)]
+        else:
+            child_files = [tempfile.NamedTemporaryFile(mode='w+', delete=False)
+                           for _ in range(num_children)]
+        child_filenames = [child_file.name for child_file in child_files]
+        try:
+            for child_num, child_file in enumerate(child_files, start=1):
                 # Write the header columns to the child file
                 header_line = '\t'.join([header_columns[0], header_columns[1],
                                          header_columns[4],
                                          header_columns[child_num + 4]])
                 child_file.write(header_line + '\n')
-                infile.seek(0)  # Reset file pointer to the beginning
-                next(infile)  # Skip the header line
-                for line in infile:
-                    columns = line.strip().split('\t')
-                    # Extract the desired columns for the current child file
-                    child_line = f"{columns[0]}\t{columns[1]}\t{columns[4]}\t" \
-                                 f"{columns[child_num + 4]}\n"
-                    child_file.write(child_line)
+            for line in infile:
+                columns = line.strip().split('\t')
+                prefix = f"{columns[0]}\t{columns[1]}\t{columns[4]}\t"
+                # Write the desired columns of every child file
+                for child_num, child_file in enumerate(child_files, start=1):
+                    child_file.write(f"{prefix}{columns[child_num + 4]}\n")
+        finally:
+            for child_file in child_files:
+                child_file.close()
     return num_children, child_filenames
 
 
-def split_file_to_chromosomes(input_file, output_directory):
+def split_file_to_chromosomes(input_file, output_directory, index_only=False,
+                              compress=False):
     """
     This function will split the input_file to different files, according to the
     number of chromosomes (e.g. 23 chromosomes in the input file)
     The files the function creates will be placed in the output_directory
+    The file is streamed once - the lines of each chromosome are buffered
+    and appended to its file, so the memory used doesn't depend on the size
+    of the file.
+    If index_only, the file is not split - instead, the byte offsets of
+    every chromosome in the input file are written to
+    CHROMOSOME_INDEX_FILE_NAME in the output_directory (see
+    create_chromosome_index).
+    The input file may be gzip/BGZF compressed (but can't be indexed then),
+    and the chromosome files are BGZF compressed if compress.
+    :return: the chromosome index if index_only, otherwise None
     """
-    # Read the input file into a df, specifying datatype for 'CHROM' as str
-    df = pd.read_table(input_file, sep='\t', dtype={'CHROM': str})
-    grouped = df.groupby('CHROM')
     os.makedirs(output_directory, exist_ok=True)
-    for chrom, group in grouped:
-        output_file = os.path.join(output_directory, f'chromosome_{chrom}.txt')
-        group.to_csv(output_file, sep='\t', index=False)
+    if index_only:
+        chromosome_index = create_chromosome_index(input_file)
+        write_chromosome_index(
+            chromosome_index,
+            os.path.join(output_directory, CHROMOSOME_INDEX_FILE_NAME),
+            input_file)
+        return chromosome_index
+    chromosome_lines = {}
+    buffered_size = 0
+    with open_text(input_file) as file:
+        header_line = file.readline().rstrip('\n') + '\n'
+        for line in file:
+            if not line.strip():
+                continue
+            if not line.endswith('\n'):
+                line += '\n'
+            chrom = line[:line.find('\t')]
+            if chrom not in chromosome_lines:
+                chromosome_lines[chrom] = [header_line]
+                # Creating the file, so later flushes append to it
+                open(chromosome_file_path(output_directory, chrom, compress),
+                     'w').close()
+            chromosome_lines[chrom].append(line)
+            buffered_size += len(line)
+            if buffered_size >= SPLIT_BUFFER_SIZE:
+                flush_chromosome_lines(chromosome_lines, output_directory,
+                                       compress)
+                buffered_size = 0
+    flush_chromosome_lines(chromosome_lines, output_directory, compress)
+
+
+def chromosome_file_path(output_directory, chrom, compress=False):
+    return compressed_path(
+        os.path.join(output_directory, f'chromosome_{chrom}.txt'), compress)
+
+
+def flush_chromosome_lines(chromosome_lines, output_directory, compress=False):
+    """
+    This function will append the buffered lines of every chromosome to its
+    file, and empty the buffers
+    """
+    for chrom, lines in chromosome_lines.items():
+        if lines:
+            with open_text(chromosome_file_path(output_directory, chrom,
+                                                compress),
+                           'a') as output_file:
+                output_file.writelines(lines)
+            lines.clear()
+
+
+def create_chromosome_index(input_file):
+    """
+    This function will create an index of the byte offsets of every
+    chromosome in the input_file, in the following format:
+    chromosome (key): list of [start offset, end offset) ranges (value)
+    A chromosome has more than one range only if its lines are not
+    contiguous in the file.
+    Compressed files can't be indexed, they should be split instead.
+    """
+    reject_compressed_index(input_file)
+    chromosome_index = {}
+    with open(input_file, 'rb') as file:
+        offset = len(file.readline())
+        range_chromosome = None
+        for line in file:
+            if not line.strip():
+                offset += len(line)
+                continue
+            chrom = line[:line.find(b'\t')].decode()
+            if chrom != range_chromosome:
+                chromosome_index.setdefault(chrom, []).append([offset, offset])
+                range_chromosome = chrom
+            offset += len(line)
+            chromosome_index[chrom][-1][1] = offset
+    return chromosome_index
+
+
+def indexed_file_state(input_file):
+    """
+    This function will return the (absolute path, size, mtime) of the
+    input_file, which the chromosome index records to detect a stale index
+    """
+    file_stat = os.stat(input_file)
+    return os.path.abspath(input_file), file_stat.st_size, \
+        file_stat.st_mtime_ns
+
+
+def write_chromosome_index(chromosome_index, index_path, input_file):
+    """
+    This function will write the chromosome_index of the input_file to
+    index_path. The first line records the path, size and mtime of the
+    input_file (see indexed_file_state), so a stale index can be detected
+    by read_chromosome_index
+    """
+    file_path, file_size, file_mtime = indexed_file_state(input_file)
+    with open(index_path, 'w') as index_file:
+        index_file.write(f"FILE\t{file_path}\t{file_size}\t{file_mtime}\n")
+        index_file.write("CHROM\tSTART\tEND\n")
+        for chrom, byte_ranges in chromosome_index.items():
+            for start, end in byte_ranges:
+                index_file.write(f"{chrom}\t{start}\t{end}\n")
+
+
+def read_chromosome_index(index_path, input_file=None):
+    """
+    This function will read a chromosome index written by
+    split_file_to_chromosomes with index_only.
+    A ValueError is raised if the indexed file was changed since the index
+    was written (or, if input_file is given, the index is of another file),
+    since its byte offsets no longer match the file.
+    """
+    chromosome_index = {}
+    with open(index_path, 'r') as index_file:
+        _, file_path, file_size, file_mtime = \
+            index_file.readline().rstrip('\n').split('\t')
+        if input_file is not None and \
+                os.path.abspath(input_file) != file_path:
+            raise ValueError(f"The chromosome index {index_path} is of "
+                             f"{file_path}, not {input_file}")
+        if not os.path.exists(file_path) or \
+                indexed_file_state(file_path) != (file_path, int(file_size),
+                                                  int(file_mtime)):
+            raise ValueError(f"The chromosome index {index_path} is stale - "
+                             f"{file_path} was changed since it was written")
+        next(index_file)  # Skip the header line
+        for line in index_file:
+            chrom, start, end = line.strip().split('\t')
+            chromosome_index.setdefault(chrom, []).append([int(start),
+                                                           int(end)])
+    return chromosome_index
+
+
+def load_chromosome_index(input_file, output_directory):
+    """
+    This function will load the chromosome index of the input_file from the
+    output_directory (see split_file_to_chromosomes with index_only),
+    creating it if it doesn't exist or is stale (see read_chromosome_index),
+    so a rerun on the same file doesn't scan it again
+    """
+    index_path = os.path.join(output_directory, CHROMOSOME_INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        try:
+            return read_chromosome_index(index_path, input_file)
+        except ValueError:
+            pass
+    return split_file_to_chromosomes(input_file, output_directory,
+                                     index_only=True)
+
+
+def read_indexed_lines(input_file, byte_ranges):
+    """
+    This function will yield the header line of the input_file, followed by
+    the lines in the byte ranges given (e.g. the ranges of a chromosome in
+    the chromosome index), without reading the rest of the file.
+    A range past the end of the file (e.g. the file was truncated after it
+    was indexed) ends at the end of the file.
+    """
+    with open(input_file, 'rb') as file:
+        yield file.readline().decode()
+        for start, end in byte_ranges:
+            file.seek(start)
+            while file.tell() < end:
+                line = file.readline()
+                if not line:
+                    break
+                yield line.decode()
+
+
+def region_index_path(input_file):
+    return input_file + REGION_INDEX_SUFFIX
+
+
+def create_region_index(input_file, bin_size=REGION_BIN_SIZE):
+    """
+    This function will create the region index of a family file, and save
+    it next to the file (see region_index_path).
+    Every chromosome is divided into bins of bin_size base pairs, and the
+    index keeps the byte offset of the first variant in each bin that has
+    variants. The lines of each chromosome must be contiguous and sorted by
+    position.
+    Compressed files can't be indexed (see query_region).
+    :return: the region index, as returned by load_region_index
+    """
+    reject_compressed_index(input_file)
+    region_index = {}
+    with open(input_file, 'rb') as file:
+        offset = len(file.readline())
+        cur_chromosome = None
+        cur_position = 0
+        for line in file:
+            columns = line.split(b'\t', 2)
+            if len(columns) < 3:
+                offset += len(line)
+                continue
+            chromosome = columns[0].decode()
+            position = int(columns[1])
+            if chromosome != cur_chromosome:
+                if chromosome in region_index:
+                    raise ValueError(f"{input_file}: the lines of chromosome "
+                                     f"{chromosome} are not contiguous")
+                region_index[chromosome] = ([], [])
+                cur_chromosome = chromosome
+                cur_position = 0
+            if position < cur_position:
+                raise ValueError(f"{input_file}: chromosome {chromosome} is "
+                                 f"not sorted by position")
+            bins, offsets = region_index[chromosome]
+            position_bin = position // bin_size
+            if not bins or bins[-1] != position_bin:
+                bins.append(position_bin)
+                offsets.append(offset)
+            cur_position = position
+            offset += len(line)
+    with open(region_index_path(input_file), 'w') as index_file:
+        index_file.write(f"BIN_SIZE\t{bin_size}\n")
+        for chromosome, (bins, offsets) in region_index.items():
+            for position_bin, bin_offset in zip(bins, offsets):
+                index_file.write(f"{chromosome}\t{position_bin}\t"
+                                 f"{bin_offset}\n")
+    return load_region_index(input_file)
+
+
+def load_region_index(input_file):
+    """
+    This function will load the region index of a family file, creating it
+    if it doesn't exist or is older than the file, in the following format:
+    {"bin_size": , "chromosomes": {chromosome: (bins, offsets)}}
+    where bins and offsets are sorted numpy arrays
+    """
+    index_path = region_index_path(input_file)
+    if not os.path.exists(index_path) or \
+            os.path.getmtime(index_path) < os.path.getmtime(input_file):
+        return create_region_index(input_file)
+    chromosome_bins = {}
+    with open(index_path, 'r') as index_file:
+        bin_size = int(index_file.readline().strip().split('\t')[1])
+        for line in index_file:
+            chromosome, position_bin, bin_offset = line.strip().split('\t')
+            bins, offsets = chromosome_bins.setdefault(chromosome, ([], []))
+            bins.append(int(position_bin))
+            offsets.append(int(bin_offset))
+    return {"bin_size": bin_size,
+            "chromosomes": {chromosome: (np.array(bins, dtype=np.int64),
+                                         np.array(offsets, dtype=np.int64))
+                            for chromosome, (bins, offsets) in
+                            chromosome_bins.items()}}
+
+
+def read_region_lines(input_file, region_index, chromosome, start, end):
+    """
+    This function will yield the header line of the family file, followed by
+    the lines of the variants in chromosome between start and end
+    (inclusive). Reading starts at the first indexed bin that can contain
+    start, and stops at the first variant after end.
+    """
+    with open(input_file, 'rb') as file:
+        yield file.readline().decode()
+        if chromosome not in region_index["chromosomes"]:
+            return
+        bins, offsets = region_index["chromosomes"][chromosome]
+        first_bin = np.searchsorted(bins, start // region_index["bin_size"])
+        if first_bin == len(bins):
+            return
+        file.seek(offsets[first_bin])
+        encoded_chromosome = chromosome.encode()
+        for line in file:
+            columns = line.split(b'\t', 2)
+            if len(columns) < 3:
+                continue
+            if columns[0] != encoded_chromosome:
+                return
+            position = int(columns[1])
+            if position > end:
+                return
+            if position >= start:
+                yield line.decode()
+
+
+def reject_compressed_index(input_file):
+    if is_compressed(input_file):
+        raise ValueError(f"{input_file} is compressed, byte offsets can only "
+                         f"be indexed in an uncompressed file")
+
+
+def scan_region_lines(input_file, chromosome, start, end):
+    """
+    This function will yield the same lines as read_region_lines, by reading
+    the family file from its beginning (for files without a region index)
+    """
+    with open_text(input_file) as file:
+        yield file.readline()
+        found_chromosome = False
+        for line in file:
+            columns = line.split('\t', 2)
+            if len(columns) < 3:
+                continue
+            if columns[0] != chromosome:
+                if found_chromosome:
+                    return
+                continue
+            found_chromosome = True
+            position = int(columns[1])
+            if position > end:
+                return
+            if position >= start:
+                yield line
+
+
+def query_region(input_file, chromosome, start, end, region_index=None):
+    """
+    This function will return the family matrix of the variants in
+    chromosome between start and end (inclusive), reading only that region
+    of the family file through its region index.
+    The index is created on the first query, and can be passed in
+    region_index to save loading it again.
+    A compressed family file has no index, so it is scanned up to the end of
+    the region instead.
+    """
+    if is_compressed(input_file):
+        return create_chromosome_matrix(
+            scan_region_lines(input_file, str(chromosome), start, end),
+            file_path=input_file)
+    if region_index is None:
+        region_index = load_region_index(input_file)
+    return create_chromosome_matrix(
+        read_region_lines(input_file, region_index, str(chromosome), start,
+                          end), file_path=input_file)
 
 
 def convert_txt_to_excel(input_file, output_excel):
-    df = pd.read_csv(input_file, sep='\t')
-    df.to_excel(output_excel, index=False)
+    with report_stage("excel_export"):
+        import pandas as pd
+        df = pd.read_csv(input_file, sep='\t')
+        df.to_excel(output_excel, index=False)
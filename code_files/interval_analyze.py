@@ -1,98 +1,305 @@
 import os
 
-import matplotlib.pyplot as plt
+import numpy as np
+
+# The intervals of a single chromosome - the chromosome isn't repeated in
+# every interval, it is kept (and passed) once for the whole array
+INTERVAL_DTYPE = np.dtype([('start', np.int64), ('end', np.int64),
+                           ('haplotype', np.int8)])
+# The shared intervals of all the children (see shared_interval) also have a
+# certainty level
+SHARED_INTERVAL_DTYPE = np.dtype(INTERVAL_DTYPE.descr +
+                                 [('certainty_level', np.int8)])
+# The certainty level of intervals that were not compared to another child
+NO_CERTAINTY = 0
+
+
+def find_interval_boundaries(positions, haplotypes, interval_len=1000000):
+    """
+    This function will find the intervals of sorted positions and their
+    haplotypes, the same way as create_intervals, using array operations.
+    An interval ends before a variant (not the last one) where the haplotype
+    switches, or where the distance from the previous variant is larger than
+    interval_len. That variant is skipped, and the next interval starts at
+    the variant after it. Therefore, in a run of consecutive boundary
+    variants, only every second one ends an interval.
+    :return: (index of the first variant of each interval, end position of
+    each interval)
+    """
+    num_variants = len(positions)
+    positions = np.asarray(positions, dtype=np.int64)
+    haplotypes = np.asarray(haplotypes)
+    # gaps[k - 1] and switches[k - 1] are for the variant k
+    gaps = np.diff(positions) > interval_len
+    switches = haplotypes[1:] != haplotypes[:-1]
+    # The last variant never ends an interval
+    boundaries = np.flatnonzero((gaps | switches)[:num_variants - 2]) + 1
+    boundary_numbers = np.arange(len(boundaries))
+    is_run_start = np.ones(len(boundaries), dtype=bool)
+    is_run_start[1:] = np.diff(boundaries) != 1
+    run_starts = np.maximum.accumulate(
+        np.where(is_run_start, boundary_numbers, 0))
+    boundaries = boundaries[(boundary_numbers - run_starts) % 2 == 0]
+    start_indices = np.concatenate(([0], boundaries + 1))
+    ends = np.empty(len(start_indices), dtype=np.int64)
+    ends[:-1] = positions[boundaries - 1] + \
+        np.where(gaps[boundaries - 1], interval_len, 0)
+    ends[-1] = positions[-1]
+    return start_indices, ends
+
+
+def create_interval_array(positions, haplotypes, interval_len=1000000):
+    """
+    This function will create the intervals of a single child from the
+    positions and haplotypes of its variants (of a single chromosome), as a
+    compact array of INTERVAL_DTYPE (start, end, haplotype)
+    The variants are in the order of the family file (the order their
+    confidence was calculated in), so they are sorted by position first, as
+    create_intervals sorts the positions of its dict.
+    """
+    if len(positions) == 0:
+        return np.zeros(0, dtype=INTERVAL_DTYPE)
+    positions = np.asarray(positions)
+    haplotypes = np.asarray(haplotypes)
+    if np.any(positions[1:] < positions[:-1]):
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order]
+        haplotypes = haplotypes[order]
+    start_indices, ends = find_interval_boundaries(positions, haplotypes,
+                                                   interval_len)
+    intervals = np.zeros(len(start_indices), dtype=INTERVAL_DTYPE)
+    intervals['start'] = positions[start_indices]
+    intervals['end'] = ends
+    intervals['haplotype'] = haplotypes[start_indices]
+    return intervals
 
 
 def create_intervals(haplotype_dict: dict, interval_len=1000000):
     """
-    This function will create a list for each child in the following format:
-    [(interval number is the index) {start position: , end position: ,
-    haplotype: (1 or 2)}
+    This function will create the intervals of a single child, as an array
+    of INTERVAL_DTYPE (start, end, haplotype) - the same as
+    create_interval_array, from a dict of the variants of the child (of a
+    single chromosome)
     each interval starts with the position of a variant from haplotype 1 or 2,
     and ends when the next variant is from the opposite haplotype, where a new
     interval will start
     """
+    if not haplotype_dict:
+        return np.zeros(0, dtype=INTERVAL_DTYPE)
     positions = sorted(haplotype_dict.keys())
-    len_positions = len(positions)
-    intervals = []
-    index = -1
-    while index < len_positions - 1:
-        index += 1
-        interval_start = positions[index]
-        interval_end = None
-        cur_position = interval_start
-        next_position = interval_start
-        chromosome = haplotype_dict[cur_position][-3]
-        cur_haplotype = haplotype_dict[cur_position][-2]
-        next_haplotype = haplotype_dict[next_position][-2]
-
-        while index < len_positions - 1:
-            # Distance between 2 variants is too big
-            if next_position - cur_position > interval_len:
-                interval_end = cur_position + interval_len
-                break
-            # Different haplotype
-            if cur_haplotype != next_haplotype:
-                interval_end = cur_position
-                break
-            # None of the conditions met, extending the interval
-            cur_position = positions[index]
-            index += 1
-            next_position = positions[index]
-            next_haplotype = haplotype_dict[next_position][-2]
-        # Finished with the current interval - adding to the list
-        if not interval_end:
-            interval_end = positions[-1]
-        current_interval = {"start": interval_start,
-                            "end": interval_end,
-                            "haplotype": cur_haplotype,
-                            "chromosome": chromosome}
-        intervals.append(current_interval)
+    values = [haplotype_dict[position] for position in positions]
+    haplotypes = [value[-2] for value in values]
+    start_indices, ends = find_interval_boundaries(positions, haplotypes,
+                                                   interval_len)
+    intervals = np.zeros(len(start_indices), dtype=INTERVAL_DTYPE)
+    intervals['start'] = np.asarray(positions)[start_indices]
+    intervals['end'] = ends
+    intervals['haplotype'] = np.asarray(haplotypes)[start_indices]
     return intervals
 
 
-def shared_interval(interval_lists):
+def create_shared_interval_array(intervals):
     """
-    This function creates a new list containing intervals that are shared
-    in all the lists given, according to the haplotype.
-    It also adds certainty level of 1 to the shared intervals.
-    If haplotypes are different, haplotype is set to 0 and certainty level to -1.
-    """
-    shared_intervals = interval_lists[0]
-    new_shared_intervals = []
-    for interval_list in interval_lists[1:]:
-        for interval_1 in shared_intervals:
-            for interval_2 in interval_list:
-                # Check if intervals overlap
-                if interval_1["start"] <= interval_2["end"] and interval_1["end"] >= interval_2["start"]:
-                    cur_shared_interval = {
-                        "start": max(interval_1["start"], interval_2["start"]),
-                        "end": min(interval_1["end"], interval_2["end"]),
-                        "haplotype": interval_1["haplotype"] if interval_1["haplotype"] == interval_2[
-                            "haplotype"] else 0,
-                        "chromosome": interval_1["chromosome"],
-                        "certainty_level": 1 if interval_1["haplotype"] == interval_2["haplotype"] else -1
-                    }
-                    new_shared_intervals.append(cur_shared_interval)
-        shared_intervals = new_shared_intervals
-        new_shared_intervals = []
+    This function will copy intervals of INTERVAL_DTYPE (or
+    SHARED_INTERVAL_DTYPE) to a new array of SHARED_INTERVAL_DTYPE -
+    intervals without a certainty level get NO_CERTAINTY
+    """
+    shared_intervals = np.zeros(len(intervals), dtype=SHARED_INTERVAL_DTYPE)
+    for field in intervals.dtype.names:
+        shared_intervals[field] = intervals[field]
+    return shared_intervals
+
+
+def intersect_intervals(shared_intervals, child_intervals):
+    """
+    This function will intersect the shared intervals of the previous
+    children with the intervals of the next child.
+    Both arrays are sorted and their intervals don't overlap, so the
+    intervals of the child overlapping a shared interval are a contiguous
+    range, found with a binary search (intervals that only touch are still
+    considered overlapping). Every overlapping pair creates a shared
+    interval from the later start to the earlier end - the haplotype is
+    kept if the child has the same haplotype (certainty level 1), and set to
+    0 otherwise (certainty level -1).
+    :return: the new shared intervals, an array of SHARED_INTERVAL_DTYPE
+    """
+    first_overlaps = np.searchsorted(child_intervals['end'],
+                                     shared_intervals['start'], side='left')
+    end_overlaps = np.searchsorted(child_intervals['start'],
+                                   shared_intervals['end'], side='right')
+    num_overlaps = np.maximum(end_overlaps - first_overlaps, 0)
+    shared_indices = np.repeat(np.arange(len(shared_intervals)), num_overlaps)
+    # The overlaps of every shared interval count up from its first overlap
+    overlap_offsets = np.cumsum(num_overlaps) - num_overlaps
+    child_indices = np.arange(len(shared_indices)) + np.repeat(
+        first_overlaps - overlap_offsets, num_overlaps)
+    shared = shared_intervals[shared_indices]
+    child = child_intervals[child_indices]
+    same_haplotype = shared['haplotype'] == child['haplotype']
+    intervals = np.zeros(len(shared), dtype=SHARED_INTERVAL_DTYPE)
+    intervals['start'] = np.maximum(shared['start'], child['start'])
+    intervals['end'] = np.minimum(shared['end'], child['end'])
+    intervals['haplotype'] = np.where(same_haplotype, shared['haplotype'], 0)
+    intervals['certainty_level'] = np.where(same_haplotype, 1, -1)
+    return intervals
+
 
+def shared_interval(interval_lists):
+    """
+    This function creates the intervals that are shared by all the interval
+    arrays given (one for every child, as created by create_interval_array
+    or create_intervals), according to the haplotype.
+    The haplotypes are compared child after child - the certainty level is 1
+    if the haplotype matches the previous children, and -1 otherwise. After a
+    mismatch, the haplotype is set to 0.
+    The arrays are intersected one child at a time (see
+    intersect_intervals), on purpose instead of a single sweep over the
+    intervals of all the children: every intersection is a few array
+    operations, while a sweep advances the children one interval at a time
+    in python, which is about 10 times slower for a family. Both give the
+    same intervals, in the same order. With a single child, its intervals
+    are returned with NO_CERTAINTY.
+    :return: array of SHARED_INTERVAL_DTYPE (start, end, haplotype,
+    certainty_level), sorted by position
+    """
+    if not interval_lists:
+        return np.zeros(0, dtype=SHARED_INTERVAL_DTYPE)
+    shared_intervals = create_shared_interval_array(interval_lists[0])
+    for child_intervals in interval_lists[1:]:
+        shared_intervals = intersect_intervals(shared_intervals,
+                                               child_intervals)
     return shared_intervals
 
 
+def interval_segments(interval_list):
+    """
+    This function will return the line segments and colors of the shared
+    intervals given, for a LineCollection - every interval is a horizontal
+    line at the height of its haplotype, red for opposing haplotypes
+    (certainty level -1) and green otherwise
+    """
+    segments = np.empty((len(interval_list), 2, 2), dtype=np.float64)
+    segments[:, 0, 0] = interval_list['start']
+    segments[:, 1, 0] = interval_list['end']
+    segments[:, :, 1] = interval_list['haplotype'][:, np.newaxis]
+    colors = np.where(interval_list['certainty_level'] == -1, 'red',
+                      'green').tolist()
+    return segments, colors
+
+
+def interval_plot_path(save_dir, plot_title):
+    return os.path.join(save_dir, f'{plot_title.replace(" ", "_")}_plot.png')
+
+
 def plot_interval(interval_list, plot_title, save_dir):
     """
     This function plots intervals as straight lines using Matplotlib.
+    All the intervals are drawn as a single LineCollection, and the figure
+    is closed after it is saved.
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
     fig, ax = plt.subplots()
-    for i, interval in enumerate(interval_list):
-        start_position = interval["start"]
-        end_position = interval["end"]
-        haplotype = interval["haplotype"]
-        certainty_level = interval.get("certainty_level", None)
-        color = 'red' if certainty_level == -1 else 'green'
-        ax.plot([start_position, end_position], [haplotype, haplotype], label=f'Interval {i + 1}', color=color)
+    segments, colors = interval_segments(interval_list)
+    ax.add_collection(LineCollection(segments, colors=colors,
+                                     capstyle='projecting'))
+    ax.autoscale_view()
     ax.set(xlabel='Chromosome Position', ylabel='Haplotype', title=plot_title)
-    save_path = os.path.join(save_dir, f'{plot_title.replace(" ", "_")}_plot.png')
+    save_path = interval_plot_path(save_dir, plot_title)
+    os.makedirs(save_dir, exist_ok=True)
+    fig.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_genome_overview(chromosome_intervals, plot_title, save_dir):
+    """
+    This function plots the intervals of all the chromosomes in a single
+    figure, one row per chromosome, instead of a plot per chromosome.
+    chromosome_intervals is a dict of chromosome number (key): interval list
+    (value)
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    fig, axes = plt.subplots(len(chromosome_intervals), 1, sharex=True,
+                             squeeze=False,
+                             figsize=(12, 0.5 * len(chromosome_intervals) + 1))
+    for ax, (chrom_num, interval_list) in zip(axes[:, 0],
+                                              chromosome_intervals.items()):
+        segments, colors = interval_segments(interval_list)
+        ax.add_collection(LineCollection(segments, colors=colors,
+                                         linewidths=3))
+        ax.margins(y=0.4)
+        ax.autoscale_view()
+        ax.set_ylabel(str(chrom_num), rotation=0, ha='right', va='center')
+        ax.set_yticks([])
+    axes[0, 0].set_title(plot_title)
+    axes[-1, 0].set_xlabel('Chromosome Position')
+    save_path = interval_plot_path(save_dir, plot_title)
     os.makedirs(save_dir, exist_ok=True)
-    plt.savefig(save_path)
+    fig.savefig(save_path)
+    plt.close(fig)
+
+
+def load_merged_interval_index(merged_file_path):
+    """
+    This function will load the merged haplotype intervals table (written by
+    merge_haplotype_tables) into an index for point lookups, in the
+    following format:
+    chromosome (key): {"starts": , "ends": , "haplotypes": ,
+    "certainties": , "ids": } (value)
+    where every value is a numpy array sorted by the start position, and the
+    id of an interval is its row number in the table (starting at 0, without
+    the header)
+    """
+    chromosome_rows = {}
+    with open(merged_file_path, 'r') as file:
+        next(file)  # Skip the header line
+        for interval_id, line in enumerate(file):
+            columns = line.strip().split('\t')
+            chromosome_rows.setdefault(columns[0], []).append(
+                (int(columns[1]), int(columns[2]), int(columns[3]),
+                 int(columns[4]), interval_id))
+    interval_index = {}
+    for chromosome, rows in chromosome_rows.items():
+        rows.sort()
+        starts, ends, haplotypes, certainties, ids = zip(*rows)
+        interval_index[chromosome] = {
+            "starts": np.array(starts, dtype=np.int64),
+            "ends": np.array(ends, dtype=np.int64),
+            "haplotypes": np.array(haplotypes, dtype=np.int8),
+            "certainties": np.array(certainties, dtype=np.int8),
+            "ids": np.array(ids, dtype=np.int64)}
+    return interval_index
+
+
+def lookup_intervals(interval_index, chromosomes, positions):
+    """
+    This function will find the shared interval (start and end inclusive)
+    of every (chromosome, position) given, using a binary search over the
+    interval index (see load_merged_interval_index). The intervals of each
+    chromosome don't overlap, so only the last interval starting at or
+    before a position can contain it.
+    :return: numpy arrays of the (haplotypes, certainties, interval ids) of
+    the positions - positions outside of all the intervals get haplotype 0,
+    certainty 0 and id -1
+    """
+    chromosomes = np.asarray(chromosomes)
+    if chromosomes.dtype.kind != 'U':
+        chromosomes = chromosomes.astype(str)
+    positions = np.asarray(positions, dtype=np.int64)
+    haplotypes = np.zeros(len(positions), dtype=np.int8)
+    certainties = np.zeros(len(positions), dtype=np.int8)
+    interval_ids = np.full(len(positions), -1, dtype=np.int64)
+    for chromosome, chromosome_intervals in interval_index.items():
+        rows = np.flatnonzero(chromosomes == chromosome)
+        candidates = np.searchsorted(chromosome_intervals["starts"],
+                                     positions[rows], side='right') - 1
+        is_found = candidates >= 0
+        is_found[is_found] = positions[rows[is_found]] <= \
+            chromosome_intervals["ends"][candidates[is_found]]
+        rows = rows[is_found]
+        candidates = candidates[is_found]
+        haplotypes[rows] = chromosome_intervals["haplotypes"][candidates]
+        certainties[rows] = chromosome_intervals["certainties"][candidates]
+        interval_ids[rows] = chromosome_intervals["ids"][candidates]
+    return haplotypes, certainties, interval_ids
@@ -1,78 +1,457 @@
 from interval_analyze import *
 from dict_analyzer import *
 from file_analyzer import *
-from test_scripts import *
+from family_matrix import *
+from chromosome_cache import *
+from run_manifest import *
+from run_report import *
+import hashlib
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+# Value of invert for creating both the regular and the inverted intervals
+BOTH_ORIENTATIONS = 2
+# The default gene panel, relative to the repository (not the working
+# directory)
+GENES_FILE = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data_files",
+    "BROCA.genes.tsv"))
+# Plot modes of create_tables_and_plots
+PLOT_CHROMOSOMES = "chromosomes"
+PLOT_DEFERRED = "deferred"
+PLOT_OVERVIEW = "overview"
+PLOT_NONE = "none"
+PLOT_MODES = (PLOT_CHROMOSOMES, PLOT_DEFERRED, PLOT_OVERVIEW, PLOT_NONE)
+CHROMOSOME_SIZES = {
+    1: 249250621, 2: 243199373, 3: 198022430, 4: 191154276,
+    5: 180915260, 6: 171115067, 7: 159138663, 8: 146364022, 9: 141213431,
+    10: 135534747, 11: 135006516, 12: 133851895, 13: 115169878,
+    14: 107349540, 15: 102531392, 16: 90354753, 17: 81195210,
+    18: 78077248, 19: 59128983, 20: 63025520, 21: 48129895,
+    22: 51304566
+}
 
-import tkinter as tk
 
-
-def process_child_file(file_path, reference_type, window_size, error_size):
+def calc_coverage(interval_list, chrom_num):
     """
-    Process a child file and return the processed dictionary.
+    This function will calculate the coverage of an interval array given
+    The coverage is the number of base pairs in all intervals, divided
+    by the whole chromosome
     """
-    child_dict = create_and_filter_dictionary(file_path, reference_type)
-    windowed_dict = process_dict(child_dict, reference_type, window_size, error_size)
-    interval_list = create_intervals(windowed_dict)
-    return interval_list
+    interval_coverage_sum = int(np.sum(interval_list['end'] -
+                                       interval_list['start']))
+    return interval_coverage_sum / CHROMOSOME_SIZES[chrom_num]
 
 
-def calc_coverage(interval_list, chrom_num):
+def process_all_chromosomes(chromosome_function, chromosome_arguments,
+                            workers=1):
     """
-    This function will calculate the coverage of an interval list given
-    The coverage is the number of base pairs in all intervals, divided
-    by the whole chromosome
+    This function will run chromosome_function (single_chromosome_process or
+    process_family_matrix) on every chromosome.
+    chromosome_arguments is a dict of chromosome number (key): the arguments
+    of chromosome_function (value).
+    With more than one worker, the chromosomes run on a process pool, and the
+    largest chromosomes are started first. If a run report is collected, the
+    reports of the workers are merged into it.
+    :return: dict of chromosome number: shared interval list, in the order of
+    chromosome_arguments
     """
-    chromosome_sizes = {
-        1: 249250621, 2: 243199373, 3: 198022430, 4: 191154276,
-        5: 180915260, 6: 171115067, 7: 159138663, 8: 146364022, 9: 141213431,
-        10: 135534747, 11: 135006516, 12: 133851895, 13: 115169878,
-        14: 107349540, 15: 102531392, 16: 90354753, 17: 81195210,
-        18: 78077248, 19: 59128983, 20: 63025520, 21: 48129895,
-        22: 51304566
-    }
-    interval_coverage_sum = 0
-    for interval in interval_list:
-        interval_coverage_sum += interval["end"] - interval["start"]
+    if workers <= 1:
+        return {chrom_num: chromosome_function(*arguments)
+                for chrom_num, arguments in chromosome_arguments.items()}
+    largest_first = sorted(chromosome_arguments,
+                           key=lambda chrom_num: CHROMOSOME_SIZES[chrom_num],
+                           reverse=True)
+    report = run_report_enabled()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if report:
+            futures = {chrom_num: executor.submit(
+                reported_call, chromosome_function,
+                *chromosome_arguments[chrom_num])
+                for chrom_num in largest_first}
+        else:
+            futures = {chrom_num: executor.submit(
+                chromosome_function, *chromosome_arguments[chrom_num])
+                for chrom_num in largest_first}
+        chromosome_results = {}
+        for chrom_num in chromosome_arguments:
+            chromosome_results[chrom_num] = futures[chrom_num].result()
+            if report:
+                chromosome_results[chrom_num], worker_report = \
+                    chromosome_results[chrom_num]
+                merge_run_report(worker_report)
+        return chromosome_results
+
+
+def load_cached_family_matrices(input_file, reference_type, cache_directory,
+                                cache_size_limit,
+                                read_matrices=read_family_matrices):
+    """
+    This function will return the family matrices of all the chromosomes of
+    the input file.
+    The matrices are loaded from the cache if the file was parsed before,
+    otherwise the file is parsed with read_matrices and the matrices are
+    saved to the cache.
+    """
+    cache_key = create_cache_key(input_file, reference_type)
+    family_matrices = load_family_matrices(cache_directory, cache_key)
+    if family_matrices is None:
+        family_matrices = read_matrices(input_file)
+        save_family_matrices(cache_directory, cache_key, family_matrices,
+                             cache_size_limit)
+    return family_matrices
+
 
-    return interval_coverage_sum / chromosome_sizes[chrom_num]
+def interval_output_directories(save_directory, invert):
+    """
+    This function will return the (inverted, tables directory, plots
+    directory) of every orientation to create.
+    invert is 0 for the regular intervals, 1 for the inverted intervals, or
+    BOTH_ORIENTATIONS for both - then the inverted tables are saved in
+    their own directory, so the merged tables don't overwrite each other.
+    """
+    regular_directories = (False, save_directory + "/interval_tables",
+                           save_directory + "/interval_plots")
+    if invert == BOTH_ORIENTATIONS:
+        return [regular_directories,
+                (True, save_directory + "/inverted_interval_tables",
+                 save_directory + "/inverted_interval_plots")]
+    if invert:
+        return [(True, save_directory + "/interval_tables",
+                 save_directory + "/inverted_interval_plots")]
+    return [regular_directories]
 
 
 def create_tables_and_plots(input_file, reference_type, save_directory, invert,
-                            window_size, error_size):
+                            window_size, error_size, workers=1,
+                            cache_directory=None,
+                            cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT,
+                            index_chromosomes=False, incremental=True,
+                            plots=PLOT_CHROMOSOMES, report=False,
+                            raw_input=False, write_intermediates=False,
+                            genes_file=GENES_FILE):
     """
     This function will create interval table from the given family.txt file
+    invert - 0 for regular intervals, 1 for inverted intervals and
+    BOTH_ORIENTATIONS for both of them from a single parse of each chromosome
+    (the reference haplotypes are inverted in memory)
+    The chromosomes are processed on a pool of the given number of workers
+    If cache_directory is given, the parsed chromosomes are cached there
+    (keyed by the content of the input file), and runs with the same input
+    skip parsing the text files.
+    If index_chromosomes, the input file is not split into chromosome files -
+    a byte offset index of the chromosomes is written instead (and reused
+    by the next runs while the input file is unchanged), and every
+    chromosome is read directly from the input file (a gzip/BGZF compressed
+    input file is always split).
+    If incremental, a run manifest of the save directory (see
+    read_run_manifest) records the input hash, the parameters and the code
+    version of every chromosome, together with its intervals. The next run
+    only processes the chromosomes that changed, and the merged tables are
+    written from the intervals saved for the rest. Deleting the manifest
+    forces a full run.
+    plots is one of PLOT_MODES:
+    PLOT_CHROMOSOMES - a plot for every chromosome, created with its table
+    PLOT_DEFERRED - the same plots, created after all the tables are written
+    PLOT_OVERVIEW - a single genome-wide plot for every orientation, created
+    after all the tables are written
+    PLOT_NONE - no plots
+    If report, the time, CPU time and peak memory of every stage, and the
+    variant and interval counts, are written to run_report.json next to the
+    interval tables (see run_report).
+    If raw_input, the input file is a raw family file (the input of
+    preprocess_file), and it is read straight into the family matrices of
+    the chromosomes (see read_raw_family_matrices), without writing the
+    preprocessed file and the chromosome files - unless
+    write_intermediates, then the preprocessed file is written to the save
+    directory.
+    genes_file is the gene panel to look up in the shared intervals (see
+    create_common_cancer_genes_dict), any number of genes in the same
+    format.
     """
-    common_cancer_variants_dict = (
-        create_common_cancer_genes_dict("data_files/BROCA.genes.tsv"))
-    if invert:
-        # Inverting the file and saving the new path
-        file_to_split = invert_reference_genome_haplotype(input_file, save_directory)
-        path_to_save_interval_table = save_directory + "/interval_tables"
-        path_to_save_interval_plots = save_directory + "/inverted_interval_plots"
-    else:
-        file_to_split = input_file
-        path_to_save_interval_table = save_directory + "/interval_tables"
-        path_to_save_interval_plots = save_directory + "/interval_plots"
-    split_file_to_chromosomes(file_to_split,
-                              save_directory + "/chromosomes")
+    if plots not in PLOT_MODES:
+        raise ValueError(f"plots should be one of {', '.join(PLOT_MODES)}, "
+                         f"got {plots}")
+    output_directories = interval_output_directories(save_directory, invert)
+    if report:
+        run_information = {"input_file": input_file,
+                           "reference_type": reference_type, "invert": invert,
+                           "window_size": window_size,
+                           "error_size": error_size, "workers": workers,
+                           "genes_file": genes_file}
+        return call_with_run_report(
+            [tables_directory for _, tables_directory, _ in
+             output_directories], run_information, create_tables_and_plots,
+            input_file, reference_type, save_directory, invert, window_size,
+            error_size, workers, cache_directory, cache_size_limit,
+            index_chromosomes, incremental, plots, False, raw_input,
+            write_intermediates, genes_file)
+    task_directories = output_directories
+    if plots != PLOT_CHROMOSOMES:
+        # The chromosome tasks only create the tables
+        task_directories = [(inverted, tables_directory, None)
+                            for inverted, tables_directory, _ in
+                            output_directories]
+    # The genes are loaded first, so a bad genes file fails the run before
+    # the chromosomes are processed
+    common_genes_dict = create_common_cancer_genes_dict(genes_file)
+    genes_index = create_genes_index(common_genes_dict)
+    with report_stage("prepare_chromosome_inputs"):
+        chromosome_inputs = prepare_chromosome_inputs(
+            input_file, reference_type, save_directory, cache_directory,
+            cache_size_limit, index_chromosomes, raw_input,
+            write_intermediates)
+    chromosome_arguments = {
+        chrom_num: (chromosome_input, reference_type, task_directories,
+                    chrom_num, window_size, error_size)
+        for chrom_num, chromosome_input in chromosome_inputs.items()}
+    with report_stage("process_chromosomes"):
+        if incremental:
+            chromosome_results = process_stale_chromosomes(
+                chromosome_arguments, save_directory, invert, workers)
+        else:
+            chromosome_results = process_all_chromosomes(
+                process_chromosome_orientations, chromosome_arguments,
+                workers)
+    write_orientation_tables(chromosome_results, output_directories,
+                             common_genes_dict, genes_index, window_size,
+                             error_size)
+    if plots in (PLOT_DEFERRED, PLOT_OVERVIEW):
+        with report_stage("plot_intervals"):
+            plot_orientation_intervals(chromosome_results, output_directories,
+                                       plots == PLOT_OVERVIEW)
+
+
+def chromosome_plot_title(chromosome_number):
+    return f'chromosome {chromosome_number} interval'
+
+
+def plot_orientation_intervals(chromosome_results, output_directories,
+                               overview=False):
+    """
+    This function will plot the shared intervals of every orientation, from
+    the results of process_chromosome_orientations of every chromosome -
+    a plot per chromosome, or a single genome-wide plot if overview
+    """
+    for orientation, (_, _, plots_directory) in enumerate(output_directories):
+        chromosome_intervals = {chrom_num: results[orientation]
+                                for chrom_num, results in
+                                chromosome_results.items()}
+        if overview:
+            plot_genome_overview(chromosome_intervals, 'genome interval',
+                                 plots_directory)
+            continue
+        for chrom_num, interval_list in chromosome_intervals.items():
+            plot_interval(interval_list, chromosome_plot_title(chrom_num),
+                          save_dir=plots_directory)
+
+
+def process_stale_chromosomes(chromosome_arguments, save_directory, invert,
+                              workers=1):
+    """
+    This function will run process_chromosome_orientations only on the
+    chromosomes whose input, parameters or code version changed since the
+    last run in save_directory (or whose outputs are missing), and update the
+    run manifest.
+    :return: dict of chromosome number: the shared interval lists of every
+    orientation, as process_all_chromosomes - the intervals of the fresh
+    chromosomes are loaded from the manifest
+    """
+    run_manifest = read_run_manifest(save_directory)
+    version = code_version()
+    chromosome_results = {}
+    stale_arguments = {}
+    stale_parameters = {}
+    input_hashes = {}
+    for chrom_num, arguments in chromosome_arguments.items():
+        chromosome_input, reference_type, output_directories, _, \
+            window_size, error_size = arguments
+        parameters = {"reference_type": reference_type, "invert": invert,
+                      "window_size": window_size, "error_size": error_size}
+        with report_stage("hash_chromosome_input"):
+            input_hashes[chrom_num] = hash_chromosome_input(chromosome_input)
+        chromosome_entry = run_manifest.get(str(chrom_num))
+        outputs_exist = all(
+            os.path.exists(table_file_path(tables_directory, chrom_num,
+                                           window_size, error_size, inverted))
+            and (plots_directory is None or os.path.exists(
+                interval_plot_path(plots_directory,
+                                   chromosome_plot_title(chrom_num))))
+            for inverted, tables_directory, plots_directory in
+            output_directories)
+        if outputs_exist and is_chromosome_fresh(chromosome_entry,
+                                                input_hashes[chrom_num],
+                                                parameters, version):
+            chromosome_results[chrom_num] = [
+                intervals_from_json(intervals)
+                for intervals in chromosome_entry["intervals"]]
+            add_count("chromosomes_reused", 1)
+        else:
+            stale_arguments[chrom_num] = arguments
+            stale_parameters[chrom_num] = parameters
+    stale_results = process_all_chromosomes(process_chromosome_orientations,
+                                            stale_arguments, workers)
+    for chrom_num, orientation_intervals in stale_results.items():
+        run_manifest[str(chrom_num)] = create_chromosome_entry(
+            input_hashes[chrom_num], stale_parameters[chrom_num], version,
+            orientation_intervals)
+    write_run_manifest(save_directory, run_manifest)
+    chromosome_results.update(stale_results)
+    return {chrom_num: chromosome_results[chrom_num]
+            for chrom_num in chromosome_arguments}
+
+
+def prepare_chromosome_inputs(input_file, reference_type, save_directory,
+                              cache_directory=None,
+                              cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT,
+                              index_chromosomes=False, raw_input=False,
+                              write_intermediates=False):
+    """
+    This function will prepare the input of every chromosome of the family
+    file for process_chromosome_orientations (see create_tables_and_plots
+    for the options)
+    :return: dict of chromosome number (key): chromosome input (value)
+    """
+    read_matrices = read_family_matrices
+    if raw_input:
+        if write_intermediates:
+            os.makedirs(save_directory, exist_ok=True)
+        if write_intermediates and cache_directory is not None:
+            # The raw file isn't read when the matrices are in the cache, so
+            # the preprocessed file is written on its own
+            preprocess_file(input_file, save_directory)
+            read_matrices = read_raw_family_matrices
+        else:
+            read_matrices = partial(
+                read_raw_family_matrices,
+                output_directory=save_directory if write_intermediates
+                else None)
+    if raw_input or cache_directory is not None:
+        if cache_directory is None:
+            family_matrices = read_matrices(input_file)
+        else:
+            family_matrices = load_cached_family_matrices(input_file,
+                                                          reference_type,
+                                                          cache_directory,
+                                                          cache_size_limit,
+                                                          read_matrices)
+        return {chrom_num: family_matrices[str(chrom_num)]
+                for chrom_num in range(1, 23)}
+    # Compressed files can't be indexed, so they are split instead
+    if index_chromosomes and not is_compressed(input_file):
+        chromosome_index = load_chromosome_index(
+            input_file, save_directory + "/chromosomes")
+        return {chrom_num: (input_file, chromosome_index.get(str(chrom_num), []))
+                for chrom_num in range(1, 23)}
+    split_file_to_chromosomes(input_file, save_directory + "/chromosomes")
+    return {chrom_num: save_directory + f"/chromosomes/chromosome_{chrom_num}.txt"
+            for chrom_num in range(1, 23)}
+
+
+def write_orientation_tables(chromosome_results, output_directories,
+                             common_genes_dict, genes_index, window_size,
+                             error_size):
+    """
+    This function will write the merged tables of every orientation, from
+    the results of process_chromosome_orientations of every chromosome
+    """
+    for orientation, (inverted, path_to_save_interval_table, _) in \
+            enumerate(output_directories):
+        chromosome_intervals = {chrom_num: results[orientation]
+                                for chrom_num, results in
+                                chromosome_results.items()}
+        write_genome_tables(chromosome_intervals, path_to_save_interval_table,
+                            common_genes_dict, genes_index, window_size,
+                            error_size, inverted)
+
+
+def write_genome_tables(chromosome_intervals, path_to_save_interval_table,
+                        common_genes_dict, genes_index, window_size,
+                        error_size, inverted):
+    """
+    This function will write the merged table and the common cancer genes
+    of a single orientation, from the shared intervals of every chromosome
+    The genes dict given is not changed, the genes found are marked in a
+    copy of it.
+    """
+    common_cancer_variants_dict = {variant_name: list(variant_info)
+                                   for variant_name, variant_info in
+                                   common_genes_dict.items()}
     chromosome_coverage_dict = {}
     # creating interval table for each chromosome
-    for chrom_num in range(1, 23):
-        interval_list = single_chromosome_process(
-            save_directory + f"/chromosomes/chromosome_{chrom_num}.txt",
-            reference_type, path_to_save_interval_table,
-            path_to_save_interval_plots, invert, chrom_num,
-            window_size, error_size)
-        update_cancer_variant_dict(interval_list,
-                                   common_cancer_variants_dict)
+    for chrom_num, interval_list in chromosome_intervals.items():
+        with report_stage("update_cancer_variant_dict"):
+            update_cancer_variant_dict(interval_list, chrom_num,
+                                       common_cancer_variants_dict,
+                                       genes_index)
         # Adding the interval coverage of the current chromosome
         chromosome_coverage_dict[chrom_num] = calc_coverage(interval_list,
                                                             chrom_num)
-    merge_haplotype_tables(path_to_save_interval_table, chromosome_coverage_dict,
-                           window_size, error_size, invert)
-    write_common_genes_to_file(path_to_save_interval_table,
-                               common_cancer_variants_dict)
+    with report_stage("merge_haplotype_tables"):
+        merge_haplotype_tables(path_to_save_interval_table,
+                               chromosome_intervals, chromosome_coverage_dict)
+    with report_stage("write_common_genes_to_file"):
+        write_common_genes_to_file(path_to_save_interval_table,
+                                   common_cancer_variants_dict)
+
+
+def process_chromosome_orientations(chromosome_input, reference_type,
+                                    output_directories, chromosome_number,
+                                    window_size, error_size):
+    """
+    This function will process a single chromosome in every orientation of
+    output_directories (see interval_output_directories).
+    chromosome_input is one of (see load_chromosome_input):
+    the path of the chromosome file, a (family file, byte ranges) pair from
+    the chromosome index, or the family matrix of the chromosome.
+    Either way, it is parsed once for all the orientations.
+    :return: list of the shared interval lists, one for every orientation
+    """
+    family_matrix = load_chromosome_input(chromosome_input)
+    add_count("chromosomes_processed", 1)
+    return [process_family_matrix(family_matrix, reference_type,
+                                  output_directory_tables,
+                                  output_directory_plots, inverted,
+                                  chromosome_number, window_size, error_size)
+            for inverted, output_directory_tables, output_directory_plots in
+            output_directories]
+
+
+def load_chromosome_input(chromosome_input):
+    """
+    This function will return the family matrix of a chromosome input given
+    to process_chromosome_orientations
+    """
+    if isinstance(chromosome_input, dict):
+        return chromosome_input
+    with report_stage("read_family_matrix"):
+        if isinstance(chromosome_input, tuple):
+            input_file, byte_ranges = chromosome_input
+            return create_chromosome_matrix(
+                read_indexed_lines(input_file, byte_ranges),
+                file_path=input_file)
+        return read_family_matrix(chromosome_input)
+
+
+def hash_chromosome_input(chromosome_input):
+    """
+    This function will return the sha256 hash of the variants of a
+    chromosome input given to process_chromosome_orientations (see
+    load_chromosome_input), without parsing it
+    """
+    if isinstance(chromosome_input, dict):
+        input_hash = hashlib.sha256(chromosome_input['positions'].tobytes())
+        input_hash.update(chromosome_input['genotypes'].tobytes())
+        return input_hash.hexdigest()
+    if isinstance(chromosome_input, tuple):
+        input_file, byte_ranges = chromosome_input
+        input_hash = hashlib.sha256()
+        for line in read_indexed_lines(input_file, byte_ranges):
+            input_hash.update(line.encode())
+        return input_hash.hexdigest()
+    return hash_file(chromosome_input)
 
 
 def single_chromosome_process(input_path, reference_type,
@@ -80,35 +459,134 @@ def single_chromosome_process(input_path, reference_type,
                               output_directory_plots,
                               inverted,
                               chromosome_number,
-                              window_size, error_size):
+                              window_size, error_size,
+                              child_files_directory=None, report=False):
     """
     This function will process a single chromosome given, creating an
     interval table, and a plot.
+    The chromosome file is parsed once, and every child is processed from
+    its (reference, child) columns in memory. For debugging, the per child
+    files (of the inverted chromosome if needed) can be written to
+    child_files_directory.
+    If report, a run report (see create_tables_and_plots) is written to
+    output_directory_tables.
+    """
+    if report:
+        run_information = {"input_file": input_path,
+                           "reference_type": reference_type,
+                           "invert": int(inverted),
+                           "chromosome_number": chromosome_number,
+                           "window_size": window_size,
+                           "error_size": error_size}
+        return call_with_run_report(
+            [output_directory_tables], run_information,
+            single_chromosome_process, input_path, reference_type,
+            output_directory_tables, output_directory_plots, inverted,
+            chromosome_number, window_size, error_size,
+            child_files_directory)
+    if child_files_directory is not None:
+        file_to_split = input_path
+        if inverted:
+            file_to_split = invert_reference_genome_haplotype(
+                input_path, input_path + "inverted")
+        open_and_split_children_files(file_to_split, child_files_directory)
+    with report_stage("read_family_matrix"):
+        family_matrix = read_family_matrix(input_path)
+    return process_family_matrix(family_matrix, reference_type,
+                                 output_directory_tables,
+                                 output_directory_plots, inverted,
+                                 chromosome_number, window_size, error_size)
+
+
+def region_process(input_file, chromosome_number, start, end,
+                   reference_type, output_directory_tables,
+                   output_directory_plots, inverted, window_size, error_size):
+    """
+    This function will process only the variants of a single region of a
+    family file (chromosome_number, between start and end), the same way as
+    single_chromosome_process. The region is read through the region index
+    of the file (see query_region), without parsing the rest of the file.
+    """
+    family_matrix = query_region(input_file, chromosome_number, start, end)
+    return process_family_matrix(family_matrix, reference_type,
+                                 output_directory_tables,
+                                 output_directory_plots, inverted,
+                                 chromosome_number, window_size, error_size)
+
+
+def process_family_matrix(family_matrix, reference_type,
+                          output_directory_tables,
+                          output_directory_plots,
+                          inverted,
+                          chromosome_number,
+                          window_size, error_size):
+    """
+    This function will process the family matrix of a single chromosome,
+    creating an interval table, and a plot (unless output_directory_plots is
+    None).
+    If inverted, the reference haplotypes are inverted in memory first.
     """
-    file_to_process = input_path
     if inverted:
-        file_to_process = invert_reference_genome_haplotype(input_path, input_path + "inverted")
-        pass
-    num_of_children, children_filenames = open_and_split_children_files(file_to_process)
+        with report_stage("invert_family_matrix"):
+            family_matrix = invert_family_matrix(family_matrix)
+    with report_stage("filter_children_genotypes"):
+        children_results = filter_children_genotypes(
+            family_matrix, reference_type,
+            [(window_size, error_size)])[(window_size, error_size)]
     interval_children_list = []
-    for i in range(1, num_of_children + 1):
-        child_filename = children_filenames[i - 1]
-        interval_list = process_child_file(child_filename, reference_type,
-                                           window_size, error_size)
-        interval_children_list.append(interval_list)
-        # Delete the last child file after processing
-        os.remove(child_filename)
-
-    shared_interval_list = shared_interval(interval_children_list)
-    create_table(shared_interval_list, output_directory_tables, window_size,
-                 error_size, inverted)
-    plot_title = f'chromosome {chromosome_number} interval'
-    plot_interval(shared_interval_list, plot_title,
-                  save_dir=output_directory_plots)
+    for positions, haplotypes, _ in children_results:
+        with report_stage("create_interval_array"):
+            interval_children_list.append(create_interval_array(positions,
+                                                                haplotypes))
+        add_count("child_intervals", len(interval_children_list[-1]))
+
+    with report_stage("shared_interval"):
+        shared_interval_list = shared_interval(interval_children_list)
+    add_count("shared_intervals", len(shared_interval_list))
+    with report_stage("create_table"):
+        create_table(shared_interval_list, output_directory_tables,
+                     window_size, error_size, inverted, chromosome_number)
+    if output_directory_plots is not None:
+        with report_stage("plot_interval"):
+            plot_interval(shared_interval_list,
+                          chromosome_plot_title(chromosome_number),
+                          save_dir=output_directory_plots)
     return shared_interval_list
 
 
-def analyze_single_chromosome(chromosome_data_file, chrom_num, reference, output_directory):
+def sweep_single_chromosome(input_path, reference_type, chromosome_number,
+                            parameters, inversions=(0, 1)):
+    """
+    This function will process a single chromosome for every
+    (window size, error size) pair in parameters, and for every inversion
+    mode given.
+    The chromosome is parsed once, each inversion mode is filtered once, and
+    the confidence of all the window sizes is calculated together.
+    :return: dict of (inverted, window size, error size) (key): dict with the
+    shared "intervals" and their "coverage" (value)
+    """
+    sweep_results = {}
+    parsed_matrix = read_family_matrix(input_path)
+    for inverted in inversions:
+        family_matrix = parsed_matrix
+        if inverted:
+            family_matrix = invert_family_matrix(parsed_matrix)
+        children_results = filter_children_genotypes(
+            family_matrix, reference_type, parameters)
+        for window_size, error_size in parameters:
+            interval_list = shared_interval(
+                [create_interval_array(positions, haplotypes)
+                 for positions, haplotypes, _ in
+                 children_results[(window_size, error_size)]])
+            sweep_results[(inverted, window_size, error_size)] = {
+                "intervals": interval_list,
+                "coverage": calc_coverage(interval_list, chromosome_number)}
+    return sweep_results
+
+
+def analyze_single_chromosome(chromosome_data_file, chrom_num, reference,
+                              output_directory, window_sizes=(20, 30, 50),
+                              error_percents=(0.95, 0.9, 0.85)):
     """
     This function will analyze a single chromosome,
     create interval tables for:
@@ -117,35 +595,52 @@ def analyze_single_chromosome(chromosome_data_file, chrom_num, reference, output
     for all the permutations of the values above, we will create
     two plots - one with error percent vs coverage and another with
     window size vs coverage
+    All the permutations are calculated together by sweep_single_chromosome
     """
+    parameters = [(window_size, window_size * error)
+                  for window_size in window_sizes
+                  for error in error_percents]
+    sweep_results = sweep_single_chromosome(chromosome_data_file, reference,
+                                            chrom_num, parameters)
     window_size_dict = {}
     error_coverage_dict = {}
     window_coverage_dict = {}
     # Creating all the interval tables
     for i in range(2):
-        for window_size in [20, 30, 50]:
-            for error in [0.95, 0.9, 0.85]:
-                interval_list = single_chromosome_process(
-                    chromosome_data_file, reference, output_directory, output_directory,
-                    i, chrom_num, window_size, window_size * error)
+        for window_size in window_sizes:
+            for error in error_percents:
+                result = sweep_results[(i, window_size, window_size * error)]
+                interval_list = result["intervals"]
+                create_table(interval_list, output_directory, window_size,
+                             window_size * error, i, chrom_num)
                 # Updating the window size and error dicts
                 key = f'chrom_{chrom_num}_window_{window_size}_error_{error}'
                 window_size_dict[key] = [window_size, error]
-                error_coverage_dict[key] = calc_coverage(interval_list, chrom_num)
+                error_coverage_dict[key] = result["coverage"]
 
                 # Add window size and coverage to window_coverage_dict
                 if window_size not in window_coverage_dict:
                     window_coverage_dict[window_size] = []
-                window_coverage_dict[window_size].append(calc_coverage(interval_list, chrom_num))
+                window_coverage_dict[window_size].append(result["coverage"])
+        # All the permutations share the same plot file, only the last one
+        # is kept
+        plot_interval(interval_list, chromosome_plot_title(chrom_num),
+                      save_dir=output_directory)
+        plot_chromosome_analyze(chrom_num, error_coverage_dict, window_size_dict, i,
+                                output_directory)
 
-        plot_chromosome_analyze(chrom_num, error_coverage_dict, window_size_dict, i)
 
-
-def plot_chromosome_analyze(chrom_num, error_coverage_dict, window_size_dict, inverted):
+def plot_chromosome_analyze(chrom_num, error_coverage_dict, window_size_dict, inverted,
+                            output_directory):
+    """
+    This function will plot the coverage of every error percent and window
+    size of analyze_single_chromosome, and save it in the output_directory
+    """
+    import matplotlib.pyplot as plt
     # Plot for Error Percent vs Coverage
     plt.figure(figsize=(12, 6))
     # Iterate through window sizes and plot lines for each
-    for window_size in [20, 30, 50]:
+    for window_size in sorted({values[0] for values in window_size_dict.values()}):
         window_data = [(values[1], error_coverage_dict[key])
                        for key, values in window_size_dict.items()
                        if values[0] == window_size]
@@ -156,19 +651,45 @@ def plot_chromosome_analyze(chrom_num, error_coverage_dict, window_size_dict, in
     plt.ylabel('Coverage')
     plt.legend()
     plt.grid(True)
-    plot_path = "temp_script/error_coverage_chr{}inverted{}.png".format(chrom_num, inverted)
+    os.makedirs(output_directory, exist_ok=True)
+    plot_path = os.path.join(output_directory,
+                             "error_coverage_chr{}inverted{}.png".format(chrom_num, inverted))
     plt.savefig(plot_path)
+    plt.close()
+
+
+def pop_option_argument(args, option, default):
+    """
+    This function will remove an optional "option value" pair (e.g.
+    "--workers 4") from the arguments given, and return the value (default if
+    the option is not given)
+    """
+    if option not in args:
+        return default
+    index = args.index(option)
+    if index + 1 >= len(args):
+        print(f"{option} requires a value")
+        sys.exit(1)
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
 
 
 def main():
-    args = sys.argv
+    args = sys.argv[:]
+    workers = int(pop_option_argument(args, "--workers", 1))
+    cache_directory = pop_option_argument(args, "--cache", None)
+    plots = pop_option_argument(args, "--plots", PLOT_CHROMOSOMES)
+    genes_file = pop_option_argument(args, "--genes", GENES_FILE)
     if len(args) not in [3, 7, 9]:
         print("Invalid number of arguments.\n"
               "For file split to chromosomes: \n"
               "input_file_to_split output_directory \n"
               "For all chromosomes: \n"
-              "input_file reference inverted(0 or 1) window_size error_size"
-              " output_directory \n"
+              "input_file reference inverted(0, 1 or 2 for both) window_size"
+              " error_size output_directory [--workers N] [--cache cache_directory]"
+              " [--plots chromosomes|deferred|overview|none]"
+              " [--genes genes_file] \n"
               "For a single chromosome: \n"
               "input_file reference inverted(0 or 1) window_size error_size"
               " output_directory_tables output_directory_plots"
@@ -180,7 +701,7 @@ def main():
 
     input_file = args[1]
     reference = args[2]
-    inverted = bool(int(args[3]))
+    inverted = int(args[3])
     window_size = int(args[4])
     error_size = int(args[5])
 
@@ -189,7 +710,9 @@ def main():
         output_directory = args[6]
         # Running the code on the given arguments
         create_tables_and_plots(input_file, reference, output_directory,
-                                inverted, window_size, error_size)
+                                inverted, window_size, error_size, workers,
+                                cache_directory, plots=plots,
+                                genes_file=genes_file)
 
     # One chromosome process
     if len(args) == 9:
@@ -201,12 +724,13 @@ def main():
                                   reference,
                                   output_directory_tables,
                                   output_directory_plots,
-                                  inverted,
+                                  bool(inverted),
                                   chromosome_number,
                                   window_size, error_size)
 
 
 def user_interface():
+    import tkinter as tk
     from code_files.user_interface import handle_response
     # Create the main window
     root = tk.Tk()
@@ -233,8 +757,7 @@ if __name__ == '__main__':
     #                      "tests/family2/test_results")
 
     # merge_haplotype_tables(r"tests/family2/interval_tables",
-    #                        {},
-    #                        50, 48, 0)
+    #                        {}, {})
 
 
 
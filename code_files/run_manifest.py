@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from interval_analyze import SHARED_INTERVAL_DTYPE
+
+RUN_MANIFEST_FILE_NAME = "run_manifest.json"
+# The modules that change the intervals of a chromosome when edited
+CODE_VERSION_MODULES = ("family_matrix.py", "dict_analyzer.py",
+                        "interval_analyze.py", "file_analyzer.py",
+                        "pilot_cancer.py", "run_manifest.py")
+
+
+def code_version():
+    """
+    This function will return the version of the interval code - the sha256
+    hash of the sources of CODE_VERSION_MODULES
+    """
+    code_directory = os.path.dirname(os.path.abspath(__file__))
+    version_hash = hashlib.sha256()
+    for module_name in CODE_VERSION_MODULES:
+        with open(os.path.join(code_directory, module_name), 'rb') as module:
+            version_hash.update(module.read())
+    return version_hash.hexdigest()
+
+
+def run_manifest_path(save_directory):
+    return os.path.join(save_directory, RUN_MANIFEST_FILE_NAME)
+
+
+def read_run_manifest(save_directory):
+    """
+    This function will read the run manifest of an output directory, in the
+    following format:
+    chromosome number (key): {"input_hash": , "parameters": ,
+    "code_version": , "intervals": } (value)
+    where intervals is the list of the shared interval lists of the
+    chromosome, one for every orientation.
+    :return: the manifest dict, empty if the directory has no (valid)
+    manifest
+    """
+    manifest_path = run_manifest_path(save_directory)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_run_manifest(save_directory, run_manifest):
+    """
+    This function will write the run manifest of an output directory (see
+    read_run_manifest), through a temporary file so an interrupted run never
+    leaves a partial manifest
+    """
+    os.makedirs(save_directory, exist_ok=True)
+    manifest_path = run_manifest_path(save_directory)
+    temporary_path = manifest_path + ".tmp"
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump(run_manifest, manifest_file)
+    os.replace(temporary_path, manifest_path)
+
+
+def intervals_to_json(interval_list):
+    """
+    This function will convert a shared interval array to plain values that
+    can be saved in the manifest - a list of the values of every field
+    """
+    return {field: interval_list[field].tolist()
+            for field in SHARED_INTERVAL_DTYPE.names}
+
+
+def intervals_from_json(interval_values):
+    """
+    This function will convert the values saved by intervals_to_json back
+    to a shared interval array
+    """
+    intervals = np.zeros(len(interval_values["start"]),
+                         dtype=SHARED_INTERVAL_DTYPE)
+    for field in SHARED_INTERVAL_DTYPE.names:
+        intervals[field] = interval_values[field]
+    return intervals
+
+
+def create_chromosome_entry(input_hash, parameters, version,
+                            orientation_intervals):
+    """
+    This function will create the manifest entry of a single chromosome,
+    from its input hash, the run parameters, the code version and the shared
+    interval lists of every orientation
+    """
+    return {"input_hash": input_hash,
+            "parameters": parameters,
+            "code_version": version,
+            "intervals": [intervals_to_json(interval_list)
+                          for interval_list in orientation_intervals]}
+
+
+def is_chromosome_fresh(chromosome_entry, input_hash, parameters, version):
+    """
+    This function will return True if the manifest entry of a chromosome was
+    created from the same input, parameters and code version given, so its
+    intervals can be reused instead of processing the chromosome again
+    """
+    return (chromosome_entry is not None and
+            chromosome_entry.get("input_hash") == input_hash and
+            chromosome_entry.get("parameters") == parameters and
+            chromosome_entry.get("code_version") == version)
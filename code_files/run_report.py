@@ -0,0 +1,182 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak RSS is not reported there
+    resource = None
+
+RUN_REPORT_FILE_NAME = "run_report.json"
+
+# The report of the current process, None when reporting is disabled
+_active_report = None
+
+
+def peak_rss_kb():
+    """
+    This function will return the peak resident memory of the process so far,
+    in kilobytes (None if it can't be measured)
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# The stage returned by report_stage when reporting is disabled
+NO_STAGE = nullcontext()
+
+
+@contextmanager
+def measured_stage(report, name):
+    """
+    This function will measure the wall time, the CPU time and the peak RSS
+    of a stage, and add them to the stage in the report when the stage ends
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        stage = report["stages"].setdefault(
+            name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_rss_kb": None})
+        stage["calls"] += 1
+        stage["wall"] += time.perf_counter() - wall_start
+        stage["cpu"] += time.process_time() - cpu_start
+        stage["peak_rss_kb"] = max_rss(stage["peak_rss_kb"], peak_rss_kb())
+
+
+def max_rss(first_rss, second_rss):
+    if first_rss is None:
+        return second_rss
+    if second_rss is None:
+        return first_rss
+    return max(first_rss, second_rss)
+
+
+def create_run_report():
+    return {"stages": {}, "counts": {}}
+
+
+def start_run_report():
+    """
+    This function will enable reporting in the current process, with a new
+    empty report
+    :return: the report
+    """
+    global _active_report
+    _active_report = create_run_report()
+    return _active_report
+
+
+def stop_run_report():
+    """
+    This function will disable reporting in the current process
+    :return: the report collected since start_run_report (None if reporting
+    was not enabled)
+    """
+    global _active_report
+    report, _active_report = _active_report, None
+    return report
+
+
+def run_report_enabled():
+    return _active_report is not None
+
+
+def report_stage(name):
+    """
+    This function will return a context manager measuring the stage given,
+    for example:
+    with report_stage("parse"):
+        ...
+    When reporting is disabled, it returns NO_STAGE, which does nothing.
+    """
+    if _active_report is None:
+        return NO_STAGE
+    return measured_stage(_active_report, name)
+
+
+def add_count(name, value):
+    """
+    This function will add value to the count given (e.g. the number of
+    variants left after a filter). Does nothing when reporting is disabled.
+    """
+    if _active_report is not None:
+        counts = _active_report["counts"]
+        counts[name] = counts.get(name, 0) + int(value)
+
+
+def merge_run_report(report):
+    """
+    This function will add a report from another process (e.g. a chromosome
+    worker, see reported_call) to the report of the current process - the
+    times and counts are summed, and the peak RSS is the maximum of the
+    processes
+    """
+    if _active_report is None or report is None:
+        return
+    for name, stage in report["stages"].items():
+        merged_stage = _active_report["stages"].setdefault(
+            name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_rss_kb": None})
+        merged_stage["calls"] += stage["calls"]
+        merged_stage["wall"] += stage["wall"]
+        merged_stage["cpu"] += stage["cpu"]
+        merged_stage["peak_rss_kb"] = max_rss(merged_stage["peak_rss_kb"],
+                                              stage["peak_rss_kb"])
+    for name, value in report["counts"].items():
+        add_count(name, value)
+
+
+def reported_call(function, *args):
+    """
+    This function will call function with reporting enabled in the current
+    process (a worker process)
+    :return: (the result of the function, the report of the call)
+    """
+    start_run_report()
+    try:
+        result = function(*args)
+    finally:
+        report = stop_run_report()
+    return result, report
+
+
+def write_run_report(report, output_directory, run_information=None):
+    """
+    This function will write the report given to RUN_REPORT_FILE_NAME in the
+    output directory, together with the run information (e.g. the run
+    parameters)
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    report_content = dict(run_information or {})
+    report_content.update(report)
+    with open(os.path.join(output_directory, RUN_REPORT_FILE_NAME),
+              'w') as report_file:
+        json.dump(report_content, report_file, indent=2)
+
+
+def call_with_run_report(output_directories, run_information, function,
+                         *args, **kwargs):
+    """
+    This function will call function with reporting enabled, and write the
+    report of the call (including the total wall time, and whether the call
+    failed) to every output directory given, even if the call fails
+    :return: the result of the function
+    """
+    start_run_report()
+    wall_start = time.perf_counter()
+    completed = False
+    try:
+        result = function(*args, **kwargs)
+        completed = True
+    finally:
+        report = stop_run_report()
+        run_information = dict(run_information,
+                               total_wall=time.perf_counter() - wall_start,
+                               completed=completed)
+        for output_directory in output_directories:
+            write_run_report(report, output_directory, run_information)
+    return result
@@ -0,0 +1,178 @@
+import argparse
+
+import numpy as np
+
+from pilot_cancer import CHROMOSOME_SIZES
+
+# The text of every genotype code, followed by a tab (see family_matrix)
+GENOTYPE_FIELDS = np.frombuffer(b"0|0\t0|1\t1|0\t1|1\t./.\t",
+                                dtype=np.uint8).reshape(5, 4)
+MISSING_GENOTYPE = 4
+BASES = np.array(list("ACGT"))
+WRITE_CHUNK_SIZE = 100000
+
+
+def chromosome_variant_counts(num_variants, rng):
+    """
+    This function will split the number of variants between the chromosomes,
+    in proportion to the chromosome sizes
+    :return: dict of chromosome number (key): number of variants (value)
+    """
+    sizes = np.array(list(CHROMOSOME_SIZES.values()), dtype=np.float64)
+    counts = rng.multinomial(num_variants, sizes / sizes.sum())
+    return dict(zip(CHROMOSOME_SIZES, counts.tolist()))
+
+
+def inherited_haplotypes(positions, chromosome_size, num_children,
+                         recombinations, rng):
+    """
+    This function will choose the parent haplotype (0 - left, 1 - right)
+    every child inherited at every position. Each child starts with a random
+    haplotype, and switches at a Poisson number (mean recombinations) of
+    random recombination points.
+    :return: int8 array of the haplotypes (variants x children)
+    """
+    haplotypes = np.empty((len(positions), num_children), dtype=np.int8)
+    for child_number in range(num_children):
+        recombination_points = np.sort(rng.integers(
+            1, chromosome_size, rng.poisson(recombinations)))
+        switches = np.searchsorted(recombination_points, positions,
+                                   side='right')
+        haplotypes[:, child_number] = (rng.integers(0, 2) + switches) % 2
+    return haplotypes
+
+
+def family_genotypes(haplotypes, error_rate, missing_rate, rng):
+    """
+    This function will create the genotype codes of the parent (column 0)
+    and the children, where every child has the parent allele of its
+    inherited haplotype, and a random allele of the other parent, in a
+    random phase.
+    A random genotype replaces error_rate of the genotypes, and
+    MISSING_GENOTYPE replaces missing_rate of them.
+    :return: int8 array of the genotype codes (variants x samples)
+    """
+    num_variants, num_children = haplotypes.shape
+    parent_alleles = rng.integers(0, 2, (num_variants, 2), dtype=np.int8)
+    genotypes = np.empty((num_variants, num_children + 1), dtype=np.int8)
+    genotypes[:, 0] = parent_alleles[:, 0] * 2 + parent_alleles[:, 1]
+    for child_number in range(num_children):
+        inherited_alleles = np.take_along_axis(
+            parent_alleles, haplotypes[:, child_number:child_number + 1],
+            axis=1)[:, 0]
+        other_alleles = rng.integers(0, 2, num_variants, dtype=np.int8)
+        inherited_left = rng.random(num_variants) < 0.5
+        genotypes[:, child_number + 1] = np.where(
+            inherited_left, inherited_alleles * 2 + other_alleles,
+            other_alleles * 2 + inherited_alleles)
+    errors = rng.random(genotypes.shape) < error_rate
+    genotypes[errors] = rng.integers(0, 4, errors.sum(), dtype=np.int8)
+    genotypes[rng.random(genotypes.shape) < missing_rate] = MISSING_GENOTYPE
+    return genotypes
+
+
+def shared_haplotype_intervals(positions, haplotypes):
+    """
+    This function will find the ground truth shared intervals - the runs of
+    variants where all the children inherited the same parent haplotype
+    :return: list of (start, end) positions of the intervals
+    """
+    is_shared = (haplotypes == haplotypes[:, :1]).all(axis=1)
+    run_edges = np.diff(np.concatenate(([0], is_shared.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(run_edges == 1)
+    run_ends = np.flatnonzero(run_edges == -1) - 1
+    return list(zip(positions[run_starts].tolist(),
+                    positions[run_ends].tolist()))
+
+
+def write_chromosome_variants(output_file, chromosome, positions, genotypes,
+                              rng):
+    """
+    This function will write the variants of a single chromosome, in chunks
+    of WRITE_CHUNK_SIZE variants
+    """
+    reference_bases = rng.integers(0, 4, len(positions))
+    alternative_bases = (reference_bases + rng.integers(1, 4, len(positions))) % 4
+    for chunk_start in range(0, len(positions), WRITE_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + WRITE_CHUNK_SIZE)
+        genotype_text = GENOTYPE_FIELDS[genotypes[chunk]].reshape(
+            len(genotypes[chunk]), -1)
+        genotype_text[:, -1] = ord('\n')
+        output_file.write(b''.join(
+            f"{chromosome}\t{position}\t{reference_base}\t"
+            f"{alternative_base}\t".encode() + row.tobytes()
+            for position, reference_base, alternative_base, row in
+            zip(positions[chunk].tolist(), BASES[reference_bases[chunk]],
+                BASES[alternative_bases[chunk]], genotype_text)))
+
+
+def generate_family(output_file, num_variants, num_children=3,
+                    recombinations=2, error_rate=0.01, missing_rate=0.0,
+                    raw=False, truth_file=None, seed=None):
+    """
+    This function will write a synthetic phased family file, of a parent
+    (the reference) and num_children children, with about num_variants
+    variants over the 22 chromosomes:
+    recombinations - the mean number of recombination points of every child
+    in every chromosome
+    error_rate - the fraction of genotypes replaced with a random genotype
+    missing_rate - the fraction of genotypes replaced with ./.
+    raw - write a raw file, with a ## meta line and a #CHROM header (the
+    input of preprocess_file), instead of a preprocessed family file
+    If truth_file is given, the ground truth shared intervals are written
+    there in the real.shared.tsv format (CHROM START END, no header).
+    :return: the number of variants written
+    """
+    rng = np.random.default_rng(seed)
+    samples = ["parent"] + [f"child_{child_number}" for child_number in
+                            range(1, num_children + 1)]
+    header_line = "CHROM\tPOS\tREF\tALT\t" + "\t".join(samples) + "\n"
+    if raw:
+        header_line = "##fileformat=VCFv4.2\n#" + header_line
+    shared_intervals = []
+    num_written = 0
+    with open(output_file, 'wb') as family_file:
+        family_file.write(header_line.encode())
+        for chrom_num, num_chromosome_variants in chromosome_variant_counts(
+                num_variants, rng).items():
+            positions = np.unique(rng.integers(
+                1, CHROMOSOME_SIZES[chrom_num], num_chromosome_variants))
+            haplotypes = inherited_haplotypes(
+                positions, CHROMOSOME_SIZES[chrom_num], num_children,
+                recombinations, rng)
+            genotypes = family_genotypes(haplotypes, error_rate,
+                                         missing_rate, rng)
+            write_chromosome_variants(family_file, chrom_num, positions,
+                                      genotypes, rng)
+            shared_intervals.extend(
+                (chrom_num, start, end) for start, end in
+                shared_haplotype_intervals(positions, haplotypes))
+            num_written += len(positions)
+    if truth_file is not None:
+        with open(truth_file, 'w') as truth:
+            for chrom_num, start, end in shared_intervals:
+                truth.write(f"{chrom_num}\t{start}\t{end}\n")
+    return num_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic phased family file")
+    parser.add_argument("output_file")
+    parser.add_argument("num_variants", type=int)
+    parser.add_argument("--children", type=int, default=3)
+    parser.add_argument("--recombinations", type=float, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--raw", action="store_true")
+    parser.add_argument("--truth", default=None,
+                        help="where to write the real.shared.tsv ground truth")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    generate_family(args.output_file, args.num_variants, args.children,
+                    args.recombinations, args.error_rate, args.missing_rate,
+                    args.raw, args.truth, args.seed)
+
+
+if __name__ == '__main__':
+    main()
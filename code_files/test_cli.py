@@ -0,0 +1,38 @@
+from cli import main
+from file_analyzer import table_file_path
+
+HEADER_LINE = "CHROM\tPOS\tREF\tALT\tparent\tc0\tc1\n"
+
+
+def family_line(chromosome, position):
+    # The children switch from the left haplotype of the parent to the right
+    # one every 100 variants
+    child = "0|0" if (position // 1000) % 200 < 100 else "1|1"
+    return f"{chromosome}\t{position}\tA\tG\t0|1\t{child}\t{child}\n"
+
+
+def test_run_region_matches_the_region_lines(tmp_path):
+    lines = [family_line(chromosome, position * 1000)
+             for chromosome in (1, 2) for position in range(1, 601)]
+    family_file = tmp_path / "family.txt"
+    family_file.write_text(HEADER_LINE + ''.join(lines))
+    region_file = tmp_path / "region.txt"
+    region_file.write_text(HEADER_LINE + ''.join(
+        line for line in lines if line.startswith("2\t") and
+        150000 <= int(line.split('\t')[1]) <= 450000))
+    region_tables = tmp_path / "region_tables"
+    expected_tables = tmp_path / "expected_tables"
+    assert main(["run-region", str(family_file), "parent", "0", "20", "18",
+                 str(region_tables), str(tmp_path / "plots"), "2", "150000",
+                 "450000", "--no-plot"]) == 0
+    assert main(["run-chromosome", str(region_file), "parent", "0", "20",
+                 "18", str(expected_tables), str(tmp_path / "plots"), "2",
+                 "--no-plot"]) == 0
+    region_table = table_file_path(str(region_tables), 2, 20, 18, False)
+    expected_table = table_file_path(str(expected_tables), 2, 20, 18, False)
+    with open(region_table) as region, open(expected_table) as expected:
+        region_rows = region.read()
+        assert region_rows and region_rows == expected.read()
+    for row in region_rows.splitlines():
+        _, start, end, _, _ = row.split('\t')
+        assert 150000 <= int(start) <= int(end) <= 450000
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from dict_analyzer import PARENT_REFERENCE, SIBLING_REFERENCE, \
+    add_haplotype_children_reference, add_haplotype_parent_reference, \
+    filter_dict_parent_reference, filter_dict_sibling_reference, \
+    filter_genotype_pairs
+from family_matrix import GENOTYPE_CODES, encode_genotype_text
+
+# Non-biallelic and missing genotypes, all encoded as UNKNOWN_GENOTYPE
+UNKNOWN_GENOTYPES = ("1|2", ".|.", "0|.")
+
+
+def dict_pair_result(reference, child, reference_type):
+    """
+    This function will run the dict filter and haplotype stages on a single
+    (reference, child) genotype pair
+    :return: (whether the pair is kept, its haplotype - None if it wasn't
+    kept, or no haplotype was added to it)
+    """
+    pair_dict = {0: [reference, child]}
+    if reference_type == PARENT_REFERENCE:
+        filtered_dict = filter_dict_parent_reference(pair_dict)
+        add_haplotype_parent_reference(filtered_dict)
+    else:
+        filtered_dict = filter_dict_sibling_reference(pair_dict)
+        add_haplotype_children_reference(filtered_dict)
+    if not filtered_dict:
+        return False, None
+    values = filtered_dict[0]
+    return True, values[2] if len(values) > 2 else None
+
+
+def matrix_pair_result(reference, child, reference_type):
+    """
+    This function will run filter_genotype_pairs on a single (reference,
+    child) genotype pair, encoded the way the family files are
+    :return: (whether the pair is kept, its haplotype - None if it wasn't
+    kept)
+    """
+    codes = encode_genotype_text(f"{reference}\t{child}\t".encode('ascii'),
+                                 2)
+    keep, haplotypes = filter_genotype_pairs(codes[:, 0], codes[:, 1],
+                                             reference_type)
+    if not keep[0]:
+        return False, None
+    return True, int(haplotypes[0])
+
+
+@pytest.mark.parametrize("reference_type",
+                         [PARENT_REFERENCE, SIBLING_REFERENCE])
+def test_known_genotype_pairs_match_dict_stages(reference_type):
+    for reference in GENOTYPE_CODES:
+        for child in GENOTYPE_CODES:
+            assert matrix_pair_result(reference, child, reference_type) == \
+                dict_pair_result(reference, child, reference_type), \
+                (reference, child)
+
+
+@pytest.mark.parametrize("reference_type",
+                         [PARENT_REFERENCE, SIBLING_REFERENCE])
+def test_unknown_genotype_pairs_are_filtered(reference_type):
+    genotypes = list(GENOTYPE_CODES) + list(UNKNOWN_GENOTYPES)
+    for reference in genotypes:
+        for child in genotypes:
+            if reference in GENOTYPE_CODES and child in GENOTYPE_CODES:
+                continue
+            assert matrix_pair_result(reference, child, reference_type) == \
+                (False, None), (reference, child)
+
+
+def test_dict_stages_keep_unknown_genotypes():
+    # The dict stages take "1|2" as a heterozygous reference, and keep the
+    # pair without a haplotype - the matrix stages filter it instead
+    assert dict_pair_result("1|2", "0|0", PARENT_REFERENCE) == (True, None)
+    assert matrix_pair_result("1|2", "0|0", PARENT_REFERENCE) == \
+        (False, None)
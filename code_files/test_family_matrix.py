@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from family_matrix import UNKNOWN_GENOTYPE, create_family_matrices, \
+    read_family_matrices
+from file_analyzer import preprocess_file, read_raw_family_matrices
+
+HEADER_LINE = "CHROM\tPOS\tREF\tALT\tparent\tc0\tc1\n"
+# The genotype columns have the right total length, but the first column is
+# 5 characters long and the second is 1 character long
+MISALIGNED_LINE = "1\t200\tA\tG\t0/1:3\t.\t1|1\n"
+
+
+def test_misaligned_row_is_normalized():
+    for unphased in (False, True):
+        family_matrices = create_family_matrices(
+            [HEADER_LINE, "1\t100\tA\tG\t0|1\t1|0\t1|1\n", MISALIGNED_LINE],
+            unphased=unphased)
+        assert family_matrices['1']['genotypes'].tolist() == \
+            [[1, 2, 3], [UNKNOWN_GENOTYPE, UNKNOWN_GENOTYPE, 3]]
+
+
+def test_misaligned_row_raw_and_preprocessed_paths_agree(tmp_path):
+    raw_file = tmp_path / "family.txt"
+    raw_file.write_text("##fileformat=VCFv4.2\n#" + HEADER_LINE +
+                        "1\t100\tA\tG\t./1\t0/0\t1|1\n" + MISALIGNED_LINE)
+    raw_matrices = read_raw_family_matrices(str(raw_file))
+    preprocessed_matrices = read_family_matrices(
+        preprocess_file(str(raw_file), str(tmp_path)))
+    assert np.array_equal(raw_matrices['1']['genotypes'],
+                          preprocessed_matrices['1']['genotypes'])
+    assert raw_matrices['1']['genotypes'][1].tolist() == \
+        [UNKNOWN_GENOTYPE, UNKNOWN_GENOTYPE, 3]
+
+
+def test_misaligned_row_with_missing_column_is_rejected():
+    with pytest.raises(ValueError):
+        create_family_matrices([HEADER_LINE, "1\t100\tA\tG\t0|1\t1|0 1|1\n"])
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from file_analyzer import CHROMOSOME_INDEX_FILE_NAME, load_chromosome_index, \
+    read_chromosome_index, read_indexed_lines
+
+HEADER_LINE = "CHROM\tPOS\tREF\tALT\tparent\tc0\n"
+
+
+def write_family_file(file_path, num_variants):
+    with open(file_path, 'w') as file:
+        file.write(HEADER_LINE)
+        for chromosome in (1, 2):
+            for position in range(1, num_variants + 1):
+                file.write(f"{chromosome}\t{position}\tA\tG\t0|1\t0|0\n")
+
+
+def test_chromosome_index_is_reused_until_the_file_changes(tmp_path):
+    family_file = str(tmp_path / "family.txt")
+    write_family_file(family_file, 10)
+    index_directory = str(tmp_path / "chromosomes")
+    chromosome_index = load_chromosome_index(family_file, index_directory)
+    index_path = os.path.join(index_directory, CHROMOSOME_INDEX_FILE_NAME)
+    index_mtime = os.stat(index_path).st_mtime_ns
+    assert load_chromosome_index(family_file, index_directory) == \
+        chromosome_index
+    assert os.stat(index_path).st_mtime_ns == index_mtime
+    write_family_file(family_file, 20)
+    with pytest.raises(ValueError):
+        read_chromosome_index(index_path, family_file)
+    new_index = load_chromosome_index(family_file, index_directory)
+    assert new_index != chromosome_index
+    assert read_chromosome_index(index_path, family_file) == new_index
+
+
+def test_indexed_lines_stop_at_the_end_of_a_truncated_file(tmp_path):
+    family_file = str(tmp_path / "family.txt")
+    write_family_file(family_file, 10)
+    chromosome_index = load_chromosome_index(family_file,
+                                             str(tmp_path / "chromosomes"))
+    with open(family_file, 'r+b') as file:
+        file.truncate(os.path.getsize(family_file) - 20)
+    lines = list(read_indexed_lines(family_file, chromosome_index['2']))
+    assert lines[0] == HEADER_LINE
+    assert 1 < len(lines) < 11
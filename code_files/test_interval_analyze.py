@@ -0,0 +1,56 @@
+import numpy as np
+
+from interval_analyze import NO_CERTAINTY, create_interval_array, \
+    shared_interval
+
+
+def random_child_intervals(rng, num_variants):
+    positions = np.sort(rng.choice(10 ** 6, num_variants, replace=False))
+    haplotypes = np.repeat(rng.integers(0, 3, num_variants // 10 + 1),
+                           10)[:num_variants]
+    return create_interval_array(positions, haplotypes, interval_len=20000)
+
+
+def sweep_shared_intervals(interval_lists):
+    """
+    This function will intersect the intervals of all the children in a
+    single sweep, advancing every child whose interval ends first
+    :return: list of the (start, end, haplotype, certainty level) of the
+    shared intervals
+    """
+    pointers = [0] * len(interval_lists)
+    shared = []
+    while all(pointer < len(intervals) for pointer, intervals in
+              zip(pointers, interval_lists)):
+        current = [intervals[pointer] for pointer, intervals in
+                   zip(pointers, interval_lists)]
+        start = max(int(interval['start']) for interval in current)
+        end = min(int(interval['end']) for interval in current)
+        if start <= end:
+            haplotype = int(current[0]['haplotype'])
+            for interval in current[1:]:
+                certainty_level = 1 if haplotype == interval['haplotype'] \
+                    else -1
+                if certainty_level == -1:
+                    haplotype = 0
+            shared.append((start, end, haplotype, certainty_level))
+        pointers = [pointer + (int(interval['end']) == end)
+                    for pointer, interval in zip(pointers, current)]
+    return shared
+
+
+def test_shared_interval_matches_a_single_sweep():
+    rng = np.random.default_rng(0)
+    for num_children in (2, 3, 5):
+        interval_lists = [random_child_intervals(rng, 500)
+                          for _ in range(num_children)]
+        shared = shared_interval(interval_lists)
+        assert [tuple(interval) for interval in shared.tolist()] == \
+            sweep_shared_intervals(interval_lists)
+
+
+def test_shared_interval_of_a_single_child():
+    intervals = random_child_intervals(np.random.default_rng(1), 100)
+    shared = shared_interval([intervals])
+    assert np.array_equal(shared['start'], intervals['start'])
+    assert np.all(shared['certainty_level'] == NO_CERTAINTY)
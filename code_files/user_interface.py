@@ -129,22 +129,28 @@ def handle_response(is_yes):
         open_no_window()
 
 
-# Create the main window
-root = tk.Tk()
-root.title("Chromosome Selection")
-root.geometry("500x300")
+def main():
+    # Create the main window
+    root = tk.Tk()
+    root.title("Chromosome Selection")
+    root.geometry("500x300")
 
-# Add a label with the question
-label = tk.Label(root, text="Do you want to work on a specific chromosome?")
-label.pack(pady=20)
+    # Add a label with the question
+    label = tk.Label(root, text="Do you want to work on a specific chromosome?")
+    label.pack(pady=20)
 
-# Add 'Yes' button
-yes_button = tk.Button(root, text="Yes", command=lambda: handle_response(True))
-yes_button.pack(side=tk.LEFT, padx=20, pady=20)
+    # Add 'Yes' button
+    yes_button = tk.Button(root, text="Yes", command=lambda: handle_response(True))
+    yes_button.pack(side=tk.LEFT, padx=20, pady=20)
 
-# Add 'No' button
-no_button = tk.Button(root, text="No", command=lambda: handle_response(False))
-no_button.pack(side=tk.RIGHT, padx=20, pady=20)
+    # Add 'No' button
+    no_button = tk.Button(root, text="No", command=lambda: handle_response(False))
+    no_button.pack(side=tk.RIGHT, padx=20, pady=20)
+
+    # Start the Tkinter event loop
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
 
-# Start the Tkinter event loop
-root.mainloop()